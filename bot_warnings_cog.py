@@ -3,13 +3,28 @@ Cog for handling warning-related commands and logic for the Discord Warning Bot.
 Includes /warn command, user context menu for warning, reason modal, and mute handling.
 """
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord import app_commands
 import asyncio
+import bisect
+import heapq
 import json
+import time
 from datetime import datetime, timedelta, timezone
 import traceback
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+async def _reply(interaction: discord.Interaction, message: str, ephemeral: bool = True):
+    """Send through the initial response if still available, else as a followup."""
+    if not interaction.response.is_done():
+        await interaction.response.send_message(message, ephemeral=ephemeral)
+    else:
+        await interaction.followup.send(message, ephemeral=ephemeral)
+
 class ReasonModal(discord.ui.Modal, title="警告理由"):
     reason_input = discord.ui.TextInput(
         label="请输入警告理由或规则编号",
@@ -32,6 +47,12 @@ class ReasonModal(discord.ui.Modal, title="警告理由"):
         await modal_submission_interaction.response.defer(ephemeral=True, thinking=False)
         # Then call _handle_warning, which will use the original_command_interaction for its followups
         await self.cog_instance._handle_warning(self.original_command_interaction, self.target_user, raw_reason_input, self.target_channel)
+        # The modal stays registered until its timeout; drop the interaction,
+        # member and cog references now so they don't linger that long.
+        self.original_command_interaction = None
+        self.target_user = None
+        self.target_channel = None
+        self.cog_instance = None
 
     async def on_error(self, modal_submission_interaction: discord.Interaction, error: Exception):
         print(f"Error in ReasonModal: {error}")
@@ -44,121 +65,272 @@ class ReasonModal(discord.ui.Modal, title="警告理由"):
             await modal_submission_interaction.followup.send("提交理由时发生后续处理错误，请联系管理员。", ephemeral=True)
 
 class WarningsCog(commands.Cog, name="Warnings"):
-    @tasks.loop(seconds=60)
-    async def unmute_task_loop(self):
-        if not hasattr(self, 'bot') or not self.bot.is_ready():
-            # print("[Unmute Task] Bot not ready or self.bot not set, skipping current loop iteration.") # Too verbose for normal operation
-            return
-        await self.bot.wait_until_ready()
-        now = datetime.now(timezone.utc)
-        mutes_to_remove = []
-        active_mutes = self.bot.warning_data.get("active_mutes", {})
-        if not active_mutes:
-            return
+    async def _unmute_scheduler(self):
+        """Sleeps until the next mute expiry instead of polling every 60 seconds.
 
-        for key, mute_info in list(active_mutes.items()):
+        The scheduler peeks the expiry heap and waits exactly until the earliest
+        unmute is due. _apply_mute sets self._unmute_wakeup after inserting a new
+        mute so the wait is recomputed immediately. With no mutes pending the
+        task is fully parked on the event and costs nothing.
+        """
+        await self.bot.wait_until_ready()
+        while True:
             try:
-                # 修复unmute_at类型兼容性问题
-                unmute_at_value = mute_info.get("unmute_at")
-                unmute_at = None
-                
-                # 处理字符串格式的ISO时间戳
-                if isinstance(unmute_at_value, str):
-                    try:
-                        unmute_at = datetime.fromisoformat(unmute_at_value)
-                    except ValueError:
-                        print(f"[Unmute Task] Error parsing ISO timestamp for key {key}: '{unmute_at_value}' is not a valid ISO format. Skipping entry.")
-                        continue
-                
-                # 处理数字格式的UNIX时间戳（历史数据兼容）
-                elif isinstance(unmute_at_value, (int, float)):
-                    try:
-                        unmute_at = datetime.fromtimestamp(unmute_at_value, tz=timezone.utc)
-                        # 更新为标准格式以避免未来再次出现此问题
-                        mute_info["unmute_at"] = unmute_at.isoformat()
-                        save_result = self.bot.save_data(self.bot.warning_data)
-                        if not save_result:
-                            print(f"[Unmute Task] Failed to save data after converting timestamp for key {key}")
-                        else:
-                            print(f"[Unmute Task] Converted numeric timestamp {unmute_at_value} to ISO format for key {key}")
-                    except (ValueError, OSError, OverflowError) as e:
-                        print(f"[Unmute Task] Error converting numeric timestamp for key {key}: {e}. Skipping entry.")
-                        continue
-                
-                # 无法处理的类型
-                else:
-                    print(f"[Unmute Task] Error processing unmute for key {key}: 'unmute_at' has unsupported type {type(unmute_at_value)} (value: {unmute_at_value}). Skipping entry.")
+                if not self._mute_expiry_heap:
+                    self._unmute_wakeup.clear()
+                    await self._unmute_wakeup.wait()
                     continue
-                
-                if now >= unmute_at:
-                    guild = self.bot.get_guild(mute_info["guild_id"])
-                    if guild:
-                        member_obj = guild.get_member(mute_info["user_id"])
-                        muted_role_obj = await self.bot.get_muted_role(guild)
-                        if member_obj and muted_role_obj and muted_role_obj in member_obj.roles:
-                            try:
-                                await member_obj.remove_roles(muted_role_obj, reason="Mute duration expired")
-                                print(f"[Unmute Task] Unmuted {member_obj.display_name} in {guild.name}.")
-                                verified_role = guild.get_role(self.bot.VERIFIED_ROLE_ID)
-                                if verified_role:
-                                    await member_obj.add_roles(verified_role, reason="Mute expired, restoring verified role")
-                                history_channel = self.bot.get_channel(self.bot.HISTORY_CHANNEL_ID)
-                                if history_channel: await history_channel.send(f"{member_obj.mention} ({member_obj.id}) 的禁言已到期并自动解除。")
-                            except discord.Forbidden:
-                                print(f"[Unmute Task] Failed to unmute {member_obj.display_name} or restore role in {guild.name} due to permissions.")
-                            except discord.HTTPException as e:
-                                print(f"[Unmute Task] HTTP error while unmuting {member_obj.display_name}: {e}")
-                        elif member_obj and muted_role_obj and muted_role_obj not in member_obj.roles:
-                             print(f"[Unmute Task] User {member_obj.display_name} was in unmute list but did not have Muted role.")
-                        elif not member_obj:
-                            print(f"[Unmute Task] Member with ID {mute_info['user_id']} not found in guild {guild.name} for unmute.")
-                    mutes_to_remove.append(key)
+                delay = max(0, self._mute_expiry_heap[0][0] - time.time())
+                if delay > 0:
+                    self._unmute_wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._unmute_wakeup.wait(), timeout=delay)
+                        continue  # A new mute arrived; recompute the next wakeup.
+                    except asyncio.TimeoutError:
+                        pass
+                await self._process_expired_mutes()
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                print(f"[Unmute Task] Error processing unmute for key {key}: {e}")
+                print(f"[Unmute Scheduler] Unexpected error: {e}")
                 traceback.print_exc()
-        
+                await asyncio.sleep(60)  # Avoid a tight error loop
+
+    async def _process_expired_mutes(self):
+        # Readiness is awaited once when the scheduler starts, so no per-call
+        # is_ready()/wait_until_ready() dance is needed here.
+        now_ts = time.time()
+        active_mutes = self.bot.warning_data.get("active_mutes", {})
+        if not self._mute_expiry_heap:
+            return
+
+        # Peek the smallest expiry; pop only entries that are actually due.
+        # Timestamps were normalized and parsed once when the heap was built,
+        # so the hot path is a float comparison, not ISO parsing.
+        due = []
+        while self._mute_expiry_heap and self._mute_expiry_heap[0][0] <= now_ts:
+            ts, key = heapq.heappop(self._mute_expiry_heap)
+            if self._unmute_epochs.get(key) != ts:
+                # Stale heap entry: the mute was removed elsewhere (e.g. manual
+                # clear) or replaced by a newer mute with a different expiry.
+                continue
+            mute_info = active_mutes.get(key)
+            if mute_info is None:
+                self._unmute_epochs.pop(key, None)
+                continue
+            due.append((key, mute_info))
+
+        if not due:
+            return
+
+        # Unmute everyone that is due concurrently; a batch of K expiries costs
+        # roughly one round of REST latency instead of K.
+        results = await asyncio.gather(
+            *(self._do_single_unmute(key, mute_info) for key, mute_info in due),
+            return_exceptions=True,
+        )
+        mutes_to_remove = []
+        for (key, _), result in zip(due, results):
+            if isinstance(result, BaseException):
+                # The heap entry was already popped; re-queue with a backoff so
+                # the mute is retried instead of sitting in active_mutes until
+                # a restart rebuilds the heap.
+                print(f"[Unmute Task] Error processing unmute for key {key}: {result}. Retrying in 60s.")
+                retry_at = time.time() + 60
+                self._unmute_epochs[key] = retry_at
+                heapq.heappush(self._mute_expiry_heap, (retry_at, key))
+            else:
+                mutes_to_remove.append(key)
+
         if mutes_to_remove:
             for key in mutes_to_remove:
                 if key in self.bot.warning_data["active_mutes"]: del self.bot.warning_data["active_mutes"][key]
-            save_result = self.bot.save_data(self.bot.warning_data)
+                self._unmute_epochs.pop(key, None)
+            save_result = await asyncio.to_thread(
+                self._append_wal, {"op": "unmute", "keys": mutes_to_remove}
+            )
             if not save_result:
                 print(f"[Unmute Task] Failed to save data after removing {len(mutes_to_remove)} expired mutes.")
             else:
                 print(f"[Unmute Task] Removed {len(mutes_to_remove)} expired mutes from data.")
 
+    async def _do_single_unmute(self, key, mute_info):
+        """Lifts one expired mute: restores roles and notifies the history channel."""
+        user_id = mute_info["user_id"]
+        guild = self.bot.get_guild(mute_info["guild_id"])
+        if not guild:
+            return
+        member_obj = guild.get_member(user_id)
+        muted_role_obj = await self._get_muted_role(guild)
+        if member_obj and muted_role_obj and muted_role_obj in member_obj.roles:
+            try:
+                # Drop the muted role and restore verified in one Modify Guild
+                # Member call instead of two rate-limited role requests.
+                verified_role = self._get_cached_role(guild, self._verified_role_id)
+                new_roles = [r for r in member_obj.roles if r != muted_role_obj]
+                if verified_role and verified_role not in new_roles:
+                    new_roles.append(verified_role)
+                await member_obj.edit(roles=new_roles, reason="Mute expired, restoring verified role")
+                print(f"[Unmute Task] Unmuted {member_obj.display_name} in {guild.name}.")
+                history_channel = self._get_history_channel()
+                if history_channel: await history_channel.send(f"{member_obj.mention} ({member_obj.id}) 的禁言已到期并自动解除。")
+            except discord.Forbidden:
+                print(f"[Unmute Task] Failed to unmute {member_obj.display_name} or restore role in {guild.name} due to permissions.")
+            except discord.HTTPException as e:
+                print(f"[Unmute Task] HTTP error while unmuting {member_obj.display_name}: {e}")
+        elif member_obj and muted_role_obj and muted_role_obj not in member_obj.roles:
+            print(f"[Unmute Task] User {member_obj.display_name} was in unmute list but did not have Muted role.")
+        elif not member_obj:
+            print(f"[Unmute Task] Member with ID {user_id} not found in guild {guild.name} for unmute.")
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.rules_data = self._load_rules_data()
-        if hasattr(self.unmute_task_loop, 'start') and callable(getattr(self.unmute_task_loop, 'start')):
-            if not self.unmute_task_loop.is_running():
-                self.unmute_task_loop.start()
-                print("[WarningsCog __init__] unmute_task_loop started.")
-        else:
-            print("[WarningsCog __init__] ERROR: self.unmute_task_loop does not have a callable 'start' method or does not exist as expected.")
+        # setup_hook attaches these to the bot before the cog is loaded; bind
+        # them once so hot paths skip the extra attribute hop through self.bot.
+        self._history_channel_id = bot.HISTORY_CHANNEL_ID
+        self._verified_role_id = bot.VERIFIED_ROLE_ID
+        self._append_wal = bot.append_wal
+        self._generate_case_id = bot.generate_case_id
+        self._get_muted_role = bot.get_muted_role
+        self._check_admin_role = bot.check_admin_role
+        self.rules_data = {"rules": [], "general_punishment_ladder": []}
+        self._index_rules_data()
+        self._mute_expiry_heap: list[tuple[float, str]] = self._build_mute_expiry_heap()
+        self._history_channel = None
+        self._role_cache: dict[tuple[int, int], discord.Role] = {}
+        self._unmute_wakeup = asyncio.Event()
+        self._unmute_scheduler_task = self.bot.loop.create_task(self._unmute_scheduler())
+        print("[WarningsCog __init__] unmute scheduler started.")
+
+    async def cog_load(self):
+        """Reads the rules file on a worker thread during cog load.
+
+        The parsed dict is cached on the bot so other cogs that need the same
+        rules reuse it instead of re-reading and re-parsing the file."""
+        cached = getattr(self.bot, "rules_cache", None)
+        if cached is None:
+            cached = await asyncio.to_thread(self._load_rules_data)
+            self.bot.rules_cache = cached
+        self.rules_data = cached
+        self._index_rules_data()
+
+        # Context menus cannot be defined inside a class with the decorator;
+        # register explicitly so reloads don't re-process the callback either.
+        self._ctx_menu = app_commands.ContextMenu(name="警告用户", callback=self.warn_context_menu)
+        self.bot.tree.add_command(self._ctx_menu)
+
+    def _get_history_channel(self):
+        """The history channel is fixed by config; resolve it once and reuse."""
+        channel = self._history_channel
+        if channel is None:
+            channel = self.bot.get_channel(self._history_channel_id)
+            self._history_channel = channel
+        return channel
+
+    def _get_cached_role(self, guild: discord.Guild, role_id: int):
+        """Per-guild role lookup cached across warnings/mutes.
+
+        Entries are dropped or refreshed by the role gateway events below, so
+        a stale Role object is never handed back after a delete/update."""
+        key = (guild.id, role_id)
+        role = self._role_cache.get(key)
+        if role is None:
+            role = guild.get_role(role_id)
+            if role is not None:
+                self._role_cache[key] = role
+        return role
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        self._role_cache.pop((role.guild.id, role.id), None)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if (after.guild.id, after.id) in self._role_cache:
+            self._role_cache[(after.guild.id, after.id)] = after
+
+    def _build_mute_expiry_heap(self):
+        """Builds a min-heap of (unmute_at epoch seconds, mute_key) from active_mutes.
+
+        Legacy 'unmute_at' values (numeric UNIX timestamps) are normalized to ISO
+        format here, once at startup, so the per-tick loop never has to parse or
+        type-check timestamps again.
+        """
+        heap = []
+        dirty = False
+        self._unmute_epochs: dict[str, float] = {}
+        active_mutes = self.bot.warning_data.get("active_mutes", {})
+        for key, mute_info in active_mutes.items():
+            unmute_at_value = mute_info.get("unmute_at")
+
+            # 处理字符串格式的ISO时间戳
+            if isinstance(unmute_at_value, str):
+                try:
+                    unmute_at = datetime.fromisoformat(unmute_at_value)
+                except ValueError:
+                    print(f"[Mute Heap] Error parsing ISO timestamp for key {key}: '{unmute_at_value}' is not a valid ISO format. Skipping entry.")
+                    continue
+
+            # 处理数字格式的UNIX时间戳（历史数据兼容）
+            elif isinstance(unmute_at_value, (int, float)):
+                try:
+                    unmute_at = datetime.fromtimestamp(unmute_at_value, tz=timezone.utc)
+                    # 更新为标准格式以避免未来再次出现此问题
+                    mute_info["unmute_at"] = unmute_at.isoformat()
+                    dirty = True
+                    print(f"[Mute Heap] Converted numeric timestamp {unmute_at_value} to ISO format for key {key}")
+                except (ValueError, OSError, OverflowError) as e:
+                    print(f"[Mute Heap] Error converting numeric timestamp for key {key}: {e}. Skipping entry.")
+                    continue
+
+            # 无法处理的类型
+            else:
+                print(f"[Mute Heap] Error building heap entry for key {key}: 'unmute_at' has unsupported type {type(unmute_at_value)} (value: {unmute_at_value}). Skipping entry.")
+                continue
+
+            epoch = unmute_at.timestamp()
+            self._unmute_epochs[key] = epoch
+            heapq.heappush(heap, (epoch, key))
+
+        # One write for all converted entries rather than one write per entry.
+        if dirty:
+            save_result = self.bot.save_data(self.bot.warning_data)
+            if not save_result:
+                print("[Mute Heap] Failed to save data after normalizing legacy timestamps.")
+        return heap
+
+    def _index_rules_data(self):
+        """Precomputes lookup structures from rules_data so the per-warn hot path
+        never re-sorts the punishment ladder."""
+        ladder = self.rules_data.get("general_punishment_ladder", [])
+        self._ladder_asc = sorted(ladder, key=lambda p: p.get("threshold", 0))
+        self._ladder_thresholds = [p.get("threshold", 0) for p in self._ladder_asc]
+        self._rules_by_id = {r["id"]: r for r in self.rules_data.get("rules", []) if "id" in r}
 
     def _load_rules_data(self):
         try:
-            with open(self.bot.RULES_DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                # 验证规则数据的基本结构
-                if not isinstance(data, dict):
-                    print(f"ERROR: Rules data at {self.bot.RULES_DATA_FILE} is not a valid JSON object. Returning empty rules.")
-                    return {"rules": [], "general_punishment_ladder": []}
-                
-                # 确保必要的键存在
-                if "rules" not in data:
-                    print(f"WARNING: Rules data at {self.bot.RULES_DATA_FILE} is missing 'rules' key. Adding empty rules list.")
-                    data["rules"] = []
-                
-                if "general_punishment_ladder" not in data:
-                    print(f"WARNING: Rules data at {self.bot.RULES_DATA_FILE} is missing 'general_punishment_ladder' key. Adding empty ladder.")
-                    data["general_punishment_ladder"] = []
-                
-                return data
+            with open(self.bot.RULES_DATA_FILE, "rb") as f:
+                raw = f.read()
+            data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+            # 验证规则数据的基本结构
+            if not isinstance(data, dict):
+                print(f"ERROR: Rules data at {self.bot.RULES_DATA_FILE} is not a valid JSON object. Returning empty rules.")
+                return {"rules": [], "general_punishment_ladder": []}
+
+            # 确保必要的键存在
+            if "rules" not in data:
+                print(f"WARNING: Rules data at {self.bot.RULES_DATA_FILE} is missing 'rules' key. Adding empty rules list.")
+                data["rules"] = []
+
+            if "general_punishment_ladder" not in data:
+                print(f"WARNING: Rules data at {self.bot.RULES_DATA_FILE} is missing 'general_punishment_ladder' key. Adding empty ladder.")
+                data["general_punishment_ladder"] = []
+
+            return data
         except FileNotFoundError:
             print(f"ERROR: Rules data file not found at {self.bot.RULES_DATA_FILE}. Returning empty rules.")
             return {"rules": [], "general_punishment_ladder": []}
-        except json.JSONDecodeError as e:
+        except ValueError as e:
             print(f"ERROR: Could not decode JSON from {self.bot.RULES_DATA_FILE}: {e}. Returning empty rules.")
             return {"rules": [], "general_punishment_ladder": []}
         except AttributeError:
@@ -169,15 +341,19 @@ class WarningsCog(commands.Cog, name="Warnings"):
             return {"rules": [], "general_punishment_ladder": []}
 
     def cog_unload(self):
-        if hasattr(self.unmute_task_loop, 'cancel') and callable(getattr(self.unmute_task_loop, 'cancel')):
-            self.unmute_task_loop.cancel()
-            print("[WarningsCog cog_unload] unmute_task_loop cancelled.")
+        if self._unmute_scheduler_task and not self._unmute_scheduler_task.done():
+            self._unmute_scheduler_task.cancel()
+            print("[WarningsCog cog_unload] unmute scheduler cancelled.")
+        ctx_menu = getattr(self, "_ctx_menu", None)
+        if ctx_menu is not None:
+            self.bot.tree.remove_command(ctx_menu.name, type=ctx_menu.type)
 
     async def _handle_warning(self, original_interaction: discord.Interaction, member: discord.Member, raw_reason_input: str, target_channel: discord.TextChannel):
         server_id = str(original_interaction.guild.id)
         user_id = str(member.id)
-        case_id = self.bot.generate_case_id()
-        timestamp = int(datetime.now(timezone.utc).timestamp())
+        case_id = self._generate_case_id()
+        timestamp = int(time.time())
+        ts_dt = datetime.fromtimestamp(timestamp, timezone.utc)
         operator_id = str(original_interaction.user.id)
         operator_name = original_interaction.user.display_name
 
@@ -185,9 +361,12 @@ class WarningsCog(commands.Cog, name="Warnings"):
         matched_rule_id = None 
         rule_specific_actions = None 
 
-        if raw_reason_input.strip().isdigit():
-            rule_id_str = raw_reason_input.strip()
-            rule_definition = next((rule for rule in self.rules_data.get("rules", []) if rule.get("id") == rule_id_str), None)
+        stripped_input = raw_reason_input.strip()
+        # isdecimal() is stricter than isdigit(): exotic unicode digits would
+        # never match a rule id anyway.
+        if stripped_input.isdecimal():
+            rule_id_str = stripped_input
+            rule_definition = self._rules_by_id.get(rule_id_str)
             if rule_definition:
                 rule_text = rule_definition.get("text", "规则描述未找到。")
                 displayed_reason = f"规则 {rule_id_str}: {rule_text}"
@@ -195,13 +374,9 @@ class WarningsCog(commands.Cog, name="Warnings"):
                 if rule_definition.get("action_type") == "specific_action":
                     rule_specific_actions = rule_definition.get("actions")
         
-        history_channel = self.bot.get_channel(self.bot.HISTORY_CHANNEL_ID)
+        history_channel = self._get_history_channel()
         if not history_channel or not isinstance(history_channel, discord.TextChannel):
-            # Ensure interaction is not already responded to before sending followup
-            if not original_interaction.response.is_done():
-                 await original_interaction.response.send_message("错误：未找到或配置错误的历史频道。请联系机器人管理员。", ephemeral=True)
-            else:
-                await original_interaction.followup.send("错误：未找到或配置错误的历史频道。请联系机器人管理员。", ephemeral=True)
+            await _reply(original_interaction, "错误：未找到或配置错误的历史频道。请联系机器人管理员。")
             return
 
         warning_entry = {
@@ -213,26 +388,16 @@ class WarningsCog(commands.Cog, name="Warnings"):
             "message_id_history_channel": None, "message_id_notification_channel": None
         }
 
-        if server_id not in self.bot.warning_data["warnings"]: self.bot.warning_data["warnings"][server_id] = {}
-        if user_id not in self.bot.warning_data["warnings"][server_id]:
-            self.bot.warning_data["warnings"][server_id][user_id] = {"entries": [], "total_warnings": 0, "per_rule_violations": {}}
-        if "per_rule_violations" not in self.bot.warning_data["warnings"][server_id][user_id]:
-            self.bot.warning_data["warnings"][server_id][user_id]["per_rule_violations"] = {}
-        if "entries" not in self.bot.warning_data["warnings"][server_id][user_id]: # Ensure entries list exists
-            self.bot.warning_data["warnings"][server_id][user_id]["entries"] = []
-
-        self.bot.warning_data["warnings"][server_id][user_id]["entries"].append(warning_entry)
-        # Recalculate total_warnings based on active warning entries
-        user_entries = self.bot.warning_data["warnings"][server_id][user_id]["entries"]
-        self.bot.warning_data["warnings"][server_id][user_id]["total_warnings"] = sum(1 for e in user_entries if e.get("entry_type") == "warning" and e.get("status") == "active")
-        total_warnings_overall = self.bot.warning_data["warnings"][server_id][user_id]["total_warnings"]
+        guild_tbl = self.bot.warning_data["warnings"].setdefault(server_id, {})
+        user_record = guild_tbl.setdefault(user_id, {"entries": [], "total_warnings": 0, "per_rule_violations": {}})
+        user_record.setdefault("per_rule_violations", {})
+        user_record.setdefault("entries", [])
+        # The embeds quote the prospective total; the record itself is only
+        # mutated after the history message succeeds, so a failed send needs
+        # no rollback and no disk write.
+        total_warnings_overall = user_record["total_warnings"] + 1
 
-        if matched_rule_id:
-            # Recalculate per_rule_violations
-            current_violations = sum(1 for e in user_entries if e.get("entry_type") == "warning" and e.get("status") == "active" and e.get("rule_id_matched") == matched_rule_id)
-            self.bot.warning_data["warnings"][server_id][user_id]["per_rule_violations"][matched_rule_id] = current_violations
-
-        history_embed = discord.Embed(title=f"用户警告记录 (Case ID: {case_id})", color=discord.Color.orange(), timestamp=datetime.fromtimestamp(timestamp, timezone.utc))
+        history_embed = discord.Embed(title=f"用户警告记录 (Case ID: {case_id})", color=discord.Color.orange(), timestamp=ts_dt)
         history_embed.add_field(name="用户", value=f"{member.mention} ({member.id})", inline=False)
         history_embed.add_field(name="操作者", value=f"{original_interaction.user.mention} ({operator_id})", inline=False)
         history_embed.add_field(name="理由", value=displayed_reason, inline=False)
@@ -242,52 +407,60 @@ class WarningsCog(commands.Cog, name="Warnings"):
         try:
             history_msg = await history_channel.send(embed=history_embed)
             warning_entry["message_id_history_channel"] = history_msg.id
-        except discord.Forbidden:
-            # Rollback counts if history message fails
-            self.bot.warning_data["warnings"][server_id][user_id]["entries"].pop()
-            self.bot.warning_data["warnings"][server_id][user_id]["total_warnings"] = sum(1 for e in self.bot.warning_data["warnings"][server_id][user_id]["entries"] if e.get("entry_type") == "warning" and e.get("status") == "active")
-            if matched_rule_id:
-                 self.bot.warning_data["warnings"][server_id][user_id]["per_rule_violations"][matched_rule_id] = sum(1 for e in self.bot.warning_data["warnings"][server_id][user_id]["entries"] if e.get("entry_type") == "warning" and e.get("status") == "active" and e.get("rule_id_matched") == matched_rule_id)
-                 if self.bot.warning_data["warnings"][server_id][user_id]["per_rule_violations"][matched_rule_id] == 0:
-                     del self.bot.warning_data["warnings"][server_id][user_id]["per_rule_violations"][matched_rule_id]
-            self.bot.save_data(self.bot.warning_data) # Save after rollback
-            if not original_interaction.response.is_done(): await original_interaction.response.send_message("错误：机器人无权限在历史频道发送消息。警告未完全记录。", ephemeral=True) 
-            else: await original_interaction.followup.send("错误：机器人无权限在历史频道发送消息。警告未完全记录。", ephemeral=True)
-            return
         except discord.HTTPException as e:
-            # Rollback counts
-            self.bot.warning_data["warnings"][server_id][user_id]["entries"].pop()
-            self.bot.warning_data["warnings"][server_id][user_id]["total_warnings"] = sum(1 for e in self.bot.warning_data["warnings"][server_id][user_id]["entries"] if e.get("entry_type") == "warning" and e.get("status") == "active")
-            if matched_rule_id:
-                 self.bot.warning_data["warnings"][server_id][user_id]["per_rule_violations"][matched_rule_id] = sum(1 for e in self.bot.warning_data["warnings"][server_id][user_id]["entries"] if e.get("entry_type") == "warning" and e.get("status") == "active" and e.get("rule_id_matched") == matched_rule_id)
-                 if self.bot.warning_data["warnings"][server_id][user_id]["per_rule_violations"][matched_rule_id] == 0:
-                     del self.bot.warning_data["warnings"][server_id][user_id]["per_rule_violations"][matched_rule_id]
-            self.bot.save_data(self.bot.warning_data) # Save after rollback
-            if not original_interaction.response.is_done(): await original_interaction.response.send_message(f"错误：发送历史消息时发生HTTP错误: {e}。警告未完全记录。", ephemeral=True)
-            else: await original_interaction.followup.send(f"错误：发送历史消息时发生HTTP错误: {e}。警告未完全记录。", ephemeral=True)
+            # Forbidden subclasses HTTPException, so one handler covers both
+            # failure modes. Nothing was recorded yet, so just report.
+            if isinstance(e, discord.Forbidden):
+                await _reply(original_interaction, "错误：机器人无权限在历史频道发送消息。警告未完全记录。")
+            else:
+                await _reply(original_interaction, f"错误：发送历史消息时发生HTTP错误: {e}。警告未完全记录。")
             return
 
-        # Save data after successful history message
-        save_result = self.bot.save_data(self.bot.warning_data)
-        if not save_result:
+        # Keep the embed's dict form on the entry so /clear can rebuild and
+        # edit the history message without fetching it first.
+        warning_entry["history_embed"] = history_embed.to_dict()
+
+        # Commit the entry now that the history message exists. New entries are
+        # always appended as active, so the cached counters can be bumped in
+        # place; load_data reconciles them against the stored entries at startup.
+        user_record["entries"].append(warning_entry)
+        self.bot.case_index[case_id] = (server_id, user_id, warning_entry)
+        user_record["total_warnings"] = total_warnings_overall
+        if matched_rule_id:
+            per_rule = user_record["per_rule_violations"]
+            per_rule[matched_rule_id] = per_rule.get(matched_rule_id, 0) + 1
+
+        # Log the new entry after the history message succeeded (the WAL append
+        # is O(one entry) instead of rewriting the whole data file) and DM the
+        # user concurrently: the two are independent, and a DM failure must not
+        # affect the save.
+        user_embed = discord.Embed(title=f"您收到了一条警告", color=discord.Color.red(), timestamp=ts_dt)
+        user_embed.add_field(name="服务器", value=original_interaction.guild.name, inline=False)
+        user_embed.add_field(name="理由", value=displayed_reason, inline=False)
+        user_embed.add_field(name="警告ID", value=case_id, inline=True)
+        user_embed.add_field(name="当前有效警告总数", value=str(total_warnings_overall), inline=True)
+        user_embed.set_footer(text=f"如有疑问，请联系管理员")
+
+        save_result, dm_result = await asyncio.gather(
+            asyncio.to_thread(
+                self._append_wal,
+                {"op": "warn", "server": server_id, "user": user_id, "entry": warning_entry}
+            ),
+            member.send(embed=user_embed),
+            return_exceptions=True,
+        )
+        if isinstance(save_result, BaseException) or not save_result:
             await original_interaction.followup.send(f"警告：保存警告数据时发生错误。警告已记录但可能不会持久保存。", ephemeral=True)
             print(f"Error saving warning data for user {member.display_name} (ID: {user_id}) in guild {original_interaction.guild.name} (ID: {server_id}).")
 
-        # Notify the user about the warning
-        try:
-            user_embed = discord.Embed(title=f"您收到了一条警告", color=discord.Color.red(), timestamp=datetime.fromtimestamp(timestamp, timezone.utc))
-            user_embed.add_field(name="服务器", value=original_interaction.guild.name, inline=False)
-            user_embed.add_field(name="理由", value=displayed_reason, inline=False)
-            user_embed.add_field(name="警告ID", value=case_id, inline=True)
-            user_embed.add_field(name="当前有效警告总数", value=str(total_warnings_overall), inline=True)
-            user_embed.set_footer(text=f"如有疑问，请联系管理员")
-            
-            await member.send(embed=user_embed)
-            await original_interaction.followup.send(f"已成功警告用户 {member.mention} (Case ID: {case_id})，并已通过私信通知。", ephemeral=True)
-        except discord.Forbidden:
+        if isinstance(dm_result, discord.Forbidden):
             await original_interaction.followup.send(f"已成功警告用户 {member.mention} (Case ID: {case_id})，但无法通过私信通知（可能已关闭私信）。", ephemeral=True)
-        except discord.HTTPException as e:
-            await original_interaction.followup.send(f"已成功警告用户 {member.mention} (Case ID: {case_id})，但通知私信发送失败: {e}", ephemeral=True)
+        elif isinstance(dm_result, discord.HTTPException):
+            await original_interaction.followup.send(f"已成功警告用户 {member.mention} (Case ID: {case_id})，但通知私信发送失败: {dm_result}", ephemeral=True)
+        elif isinstance(dm_result, BaseException):
+            raise dm_result
+        else:
+            await original_interaction.followup.send(f"已成功警告用户 {member.mention} (Case ID: {case_id})，并已通过私信通知。", ephemeral=True)
 
         # Check if punishment is needed based on warning count
         await self._check_and_apply_punishment(original_interaction, member, total_warnings_overall, matched_rule_id, rule_specific_actions, case_id)
@@ -306,20 +479,16 @@ class WarningsCog(commands.Cog, name="Warnings"):
             # Example: if "permanent_remove_from_group" in rule_actions...
             return
 
-        # Otherwise, check general punishment ladder
-        general_punishments = self.rules_data.get("general_punishment_ladder", [])
-        if not general_punishments:
+        # Otherwise, check the general punishment ladder.
+        # The ladder is pre-sorted ascending at load time, so the highest
+        # applicable tier is a binary search away.
+        if not self._ladder_asc:
             return
-        
-        # Find the highest applicable punishment level
-        applicable_punishment = None
-        for punishment in sorted(general_punishments, key=lambda x: x.get("threshold", 0), reverse=True):
-            if warning_count >= punishment.get("threshold", 0):
-                applicable_punishment = punishment
-                break
-        
-        if not applicable_punishment:
+
+        idx = bisect.bisect_right(self._ladder_thresholds, warning_count) - 1
+        if idx < 0:
             return
+        applicable_punishment = self._ladder_asc[idx]
             
         action = applicable_punishment.get("action")
         if not action:
@@ -342,7 +511,7 @@ class WarningsCog(commands.Cog, name="Warnings"):
                 reason = applicable_punishment.get("description_template", "违反群规").format(count=warning_count)
                 await member.kick(reason=reason)
                 await interaction.followup.send(f"已将 {member.mention} 移出服务器 (原因: {reason})。", ephemeral=True)
-                history_channel = interaction.guild.get_channel(self.bot.HISTORY_CHANNEL_ID)
+                history_channel = self._get_history_channel()
                 if history_channel:
                     await history_channel.send(f"{member.mention} ({member.id}) 已被移出服务器。原因: {reason}")
             except discord.Forbidden:
@@ -355,7 +524,7 @@ class WarningsCog(commands.Cog, name="Warnings"):
                 reason = applicable_punishment.get("description_template", "违反群规").format(count=warning_count)
                 await member.ban(reason=reason)
                 await interaction.followup.send(f"已将 {member.mention} 永久封禁 (原因: {reason})。", ephemeral=True)
-                history_channel = interaction.guild.get_channel(self.bot.HISTORY_CHANNEL_ID)
+                history_channel = self._get_history_channel()
                 if history_channel:
                     await history_channel.send(f"{member.mention} ({member.id}) 已被永久封禁。原因: {reason}")
             except discord.Forbidden:
@@ -372,16 +541,34 @@ class WarningsCog(commands.Cog, name="Warnings"):
         user_id = str(member.id)
         mute_key = f"{server_id}-{user_id}"
         
+        # Calculate unmute time
+        now = datetime.now(timezone.utc)
+        unmute_at = now + timedelta(minutes=duration_minutes)
+        unmute_ts = int(unmute_at.timestamp())
+
+        # Native timeouts are a single PATCH that Discord expires server-side:
+        # no role swap, no scheduler entry, no unmute call later. Discord caps
+        # them at 28 days, so longer mutes fall through to the role-based path.
+        if getattr(self.bot, "USE_NATIVE_TIMEOUT", False) and duration_minutes <= 28 * 24 * 60:
+            try:
+                timeout_reason = f"禁言处罚 (Case ID: {case_id})" if case_id else f"禁言 {duration_minutes} 分钟"
+                await member.timeout(unmute_at, reason=timeout_reason)
+            except discord.Forbidden:
+                await interaction.followup.send(f"无权限禁言 {member.mention}。", ephemeral=True)
+                return
+            except discord.HTTPException as e:
+                await interaction.followup.send(f"尝试禁言 {member.mention} 时发生错误: {e}", ephemeral=True)
+                return
+            await interaction.followup.send(f"已禁言 {member.mention} {duration_minutes} 分钟。将在 <t:{unmute_ts}:f> 解除。", ephemeral=True)
+            await self._notify_mute(interaction, member, duration_minutes, unmute_ts, now)
+            return
+
         # Get or create muted role
-        muted_role = await self.bot.get_muted_role(interaction.guild)
+        muted_role = await self._get_muted_role(interaction.guild)
         if not muted_role:
             await interaction.followup.send("无法创建或获取禁言角色。", ephemeral=True)
             return
-            
-        # Calculate unmute time
-        now = datetime.now(timezone.utc)
-        unmute_at = now + timedelta(minutes=duration_minutes)
-        
+
         # Store mute info
         mute_info = {
             "user_id": int(user_id),
@@ -395,103 +582,105 @@ class WarningsCog(commands.Cog, name="Warnings"):
         
         # Apply mute
         try:
-            # Remove verified role if applicable
-            verified_role = interaction.guild.get_role(self.bot.VERIFIED_ROLE_ID)
-            if verified_role and verified_role in member.roles:
-                await member.remove_roles(verified_role, reason=f"Muted for {duration_minutes} minutes")
-                
-            # Add muted role
-            await member.add_roles(muted_role, reason=f"Muted for {duration_minutes} minutes")
+            # Swap the verified role for the muted role in a single Modify
+            # Guild Member call instead of two rate-limited role requests.
+            verified_role = self._get_cached_role(interaction.guild, self._verified_role_id)
+            new_roles = [r for r in member.roles if r != verified_role]
+            if muted_role not in new_roles:
+                new_roles.append(muted_role)
+            await member.edit(roles=new_roles, reason=f"Muted for {duration_minutes} minutes")
             
             # Save mute info
             self.bot.warning_data["active_mutes"][mute_key] = mute_info
-            save_result = self.bot.save_data(self.bot.warning_data)
+            unmute_epoch = unmute_at.timestamp()
+            self._unmute_epochs[mute_key] = unmute_epoch
+            heapq.heappush(self._mute_expiry_heap, (unmute_epoch, mute_key))
+            self._unmute_wakeup.set()  # Wake the scheduler so it recomputes the next expiry
+            save_result = await asyncio.to_thread(
+                self._append_wal,
+                {"op": "mute", "key": mute_key, "info": mute_info}
+            )
             
             if not save_result:
                 await interaction.followup.send(f"已禁言 {member.mention} {duration_minutes} 分钟，但保存禁言数据时发生错误。", ephemeral=True)
                 print(f"Error saving mute data for user {member.display_name} (ID: {user_id}) in guild {interaction.guild.name} (ID: {server_id}).")
             else:
-                await interaction.followup.send(f"已禁言 {member.mention} {duration_minutes} 分钟。将在 <t:{int(unmute_at.timestamp())}:f> 解除。", ephemeral=True)
-                
-            # Notify history channel
-            history_channel = interaction.guild.get_channel(self.bot.HISTORY_CHANNEL_ID)
-            if history_channel:
-                await history_channel.send(f"{member.mention} ({member.id}) 已被禁言 {duration_minutes} 分钟。将在 <t:{int(unmute_at.timestamp())}:f> 解除。")
-                
-            # Try to notify the user
-            try:
-                user_embed = discord.Embed(title=f"您已被禁言", color=discord.Color.red(), timestamp=now)
-                user_embed.add_field(name="服务器", value=interaction.guild.name, inline=False)
-                user_embed.add_field(name="持续时间", value=f"{duration_minutes} 分钟", inline=True)
-                user_embed.add_field(name="解除时间", value=f"<t:{int(unmute_at.timestamp())}:f>", inline=True)
-                user_embed.set_footer(text=f"如有疑问，请联系管理员")
-                
-                await member.send(embed=user_embed)
-            except (discord.Forbidden, discord.HTTPException):
-                # Silently fail if we can't DM the user
-                pass
-                
+                await interaction.followup.send(f"已禁言 {member.mention} {duration_minutes} 分钟。将在 <t:{unmute_ts}:f> 解除。", ephemeral=True)
+
+            await self._notify_mute(interaction, member, duration_minutes, unmute_ts, now)
+
         except discord.Forbidden:
             await interaction.followup.send(f"无权限禁言 {member.mention}。", ephemeral=True)
         except discord.HTTPException as e:
             await interaction.followup.send(f"尝试禁言 {member.mention} 时发生错误: {e}", ephemeral=True)
 
-    @app_commands.command(name="warn", description="警告一个用户")
-    @app_commands.describe(member="要警告的用户")
-    async def warn_slash_command(self, interaction: discord.Interaction, member: discord.Member):
-        """Slash command to warn a user."""
-        if not await self.bot.check_admin_role(interaction):
-            return
-            
-        # Prevent warning the bot itself
+    async def _notify_mute(self, interaction: discord.Interaction, member: discord.Member, duration_minutes: int, unmute_ts: int, now: datetime):
+        """Posts the mute to the history channel and DMs the user."""
+        history_channel = self._get_history_channel()
+        if history_channel:
+            await history_channel.send(f"{member.mention} ({member.id}) 已被禁言 {duration_minutes} 分钟。将在 <t:{unmute_ts}:f> 解除。")
+
+        # Try to notify the user
+        try:
+            user_embed = discord.Embed(title=f"您已被禁言", color=discord.Color.red(), timestamp=now)
+            user_embed.add_field(name="服务器", value=interaction.guild.name, inline=False)
+            user_embed.add_field(name="持续时间", value=f"{duration_minutes} 分钟", inline=True)
+            user_embed.add_field(name="解除时间", value=f"<t:{unmute_ts}:f>", inline=True)
+            user_embed.set_footer(text=f"如有疑问，请联系管理员")
+
+            await member.send(embed=user_embed)
+        except (discord.Forbidden, discord.HTTPException):
+            # Silently fail if we can't DM the user
+            pass
+
+    # Rejection messages for invalid warn targets, keyed by target class.
+    # Class-level so the literals are not rebuilt per invocation.
+    _INVALID_TARGET = {
+        "self_bot": "我不能警告自己！",
+        "bot": "不能警告机器人用户。",
+        "self": "你不能警告自己！",
+    }
+
+    def _classify_target(self, interaction: discord.Interaction, member: discord.Member):
         if member.id == self.bot.user.id:
-            await interaction.response.send_message("我不能警告自己！", ephemeral=True)
-            return
-            
-        # Prevent warning other bots
+            return "self_bot"
         if member.bot:
-            await interaction.response.send_message("不能警告机器人用户。", ephemeral=True)
-            return
-            
-        # Prevent warning yourself
+            return "bot"
         if member.id == interaction.user.id:
-            await interaction.response.send_message("你不能警告自己！", ephemeral=True)
+            return "self"
+        return None
+
+    async def _preflight_warn(self, interaction: discord.Interaction, member: discord.Member) -> bool:
+        """Shared admin/target validation for both warn entry points."""
+        if not await self._check_admin_role(interaction):
+            return False
+        msg = self._INVALID_TARGET.get(self._classify_target(interaction, member))
+        if msg:
+            await interaction.response.send_message(msg, ephemeral=True)
+            return False
+        return True
+
+    async def _start_warn_flow(self, interaction: discord.Interaction, member: discord.Member):
+        if not await self._preflight_warn(interaction, member):
             return
-            
+
         # Defer the response to allow time for the modal
         await interaction.response.defer(ephemeral=True, thinking=True)
-        
+
         # Show the reason modal
         modal = ReasonModal(interaction, member, interaction.channel, self)
         await interaction.followup.send_modal(modal)
 
-    @app_commands.context_menu(name="警告用户")
+    @app_commands.command(name="warn", description="警告一个用户")
+    @app_commands.describe(member="要警告的用户")
+    async def warn_slash_command(self, interaction: discord.Interaction, member: discord.Member):
+        """Slash command to warn a user."""
+        await self._start_warn_flow(interaction, member)
+
     async def warn_context_menu(self, interaction: discord.Interaction, member: discord.Member):
-        """Context menu command to warn a user."""
-        if not await self.bot.check_admin_role(interaction):
-            return
-            
-        # Prevent warning the bot itself
-        if member.id == self.bot.user.id:
-            await interaction.response.send_message("我不能警告自己！", ephemeral=True)
-            return
-            
-        # Prevent warning other bots
-        if member.bot:
-            await interaction.response.send_message("不能警告机器人用户。", ephemeral=True)
-            return
-            
-        # Prevent warning yourself
-        if member.id == interaction.user.id:
-            await interaction.response.send_message("你不能警告自己！", ephemeral=True)
-            return
-            
-        # Defer the response to allow time for the modal
-        await interaction.response.defer(ephemeral=True, thinking=True)
-        
-        # Show the reason modal
-        modal = ReasonModal(interaction, member, interaction.channel, self)
-        await interaction.followup.send_modal(modal)
+        """Context menu command to warn a user. Registered in cog_load: the
+        app_commands.context_menu decorator does not support cog methods."""
+        await self._start_warn_flow(interaction, member)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(WarningsCog(bot))
@@ -7,8 +7,17 @@ import discord
 from discord.ext import commands, tasks
 import json
 import os
+
+# orjson serializes/parses several times faster than stdlib json; fall back
+# gracefully when it isn't installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
 import random
 import string
+import threading
+import time
 import asyncio
 from datetime import datetime, timedelta, timezone
 
@@ -18,45 +27,126 @@ TOKEN = os.environ.get("DISCORD_BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")
 # 使用相对路径，便于跨平台部署
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_FILE = os.path.join(BASE_DIR, "warnings_data.json")
+WAL_FILE = os.path.join(BASE_DIR, "warnings_data.log")
 RULES_DATA_FILE = os.path.join(BASE_DIR, "rules_database.json")
 
 ADMIN_ROLE_ID = 959251532535169065
 HISTORY_CHANNEL_ID = 1076394033003368449
 MUTED_ROLE_NAME = "Muted"
 VERIFIED_ROLE_ID = 881855912908845077 # Role to be removed on mute and restored on unmute
+# 使用Discord原生超时（单次PATCH请求，由Discord服务端自动到期解除），
+# 设为False则保留基于角色的禁言方式（需要机器人自行计时解除）
+USE_NATIVE_TIMEOUT = os.environ.get("USE_NATIVE_TIMEOUT", "1") not in ("0", "false", "False")
 
 # --- Bot Setup ---
-intents = discord.Intents.default()
-intents.members = True
-intents.message_content = True # Required for message content access if not using only slash commands
+# 机器人只用斜杠命令：guilds提供频道/身份组缓存，members提供成员进出事件
+# 与get_member查询。不订阅消息类intent，减少网关流量与缓存占用。
+intents = discord.Intents(guilds=True, members=True)
 
 bot = commands.Bot(command_prefix="!", intents=intents) # Prefix is fallback, primarily using app commands
 
 # --- Data Management ---
+def _reconcile_warning_counts(data):
+    """Recomputes each user's cached counters from their stored entries.
+
+    Runs once at load time so the command hot paths can maintain
+    total_warnings and per_rule_violations incrementally without drifting
+    from the entries list."""
+    for server_users in data.get("warnings", {}).values():
+        for user_data in server_users.values():
+            total = 0
+            per_rule = {}
+            for entry in user_data.get("entries", []):
+                if entry.get("entry_type") == "warning" and entry.get("status") == "active":
+                    total += 1
+                    rule_id = entry.get("rule_id_matched")
+                    if rule_id:
+                        per_rule[rule_id] = per_rule.get(rule_id, 0) + 1
+            user_data["total_warnings"] = total
+            user_data["per_rule_violations"] = per_rule
+
+# (mtime_ns, size) of DATA_FILE as of the last load/save, for the reload
+# fast path below.
+_data_file_sig = None
+
+def _stat_sig(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
 def load_data():
     """Loads warning data from the JSON file."""
+    global _data_file_sig
+    # Defensive reloads (reconnects, event-handler fallbacks) return the
+    # in-memory dict when the snapshot on disk is unchanged; memory is always
+    # at least as new as snapshot + WAL, so a re-parse would be wasted work.
+    cached = getattr(bot, "warning_data", None)
+    if cached is not None and _data_file_sig is not None and _stat_sig(DATA_FILE) == _data_file_sig:
+        return cached
     if os.path.exists(DATA_FILE):
         try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                # Ensure top-level keys exist
-                if "warnings" not in data:
-                    data["warnings"] = {}
-                if "active_mutes" not in data:
-                    data["active_mutes"] = {}
-                if "member_activity" not in data: # New key for member join/leave logs
-                    data["member_activity"] = {}
-                return data
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON from {DATA_FILE}. Starting with empty data.")
-            return {"warnings": {}, "active_mutes": {}, "member_activity": {}}
-    return {"warnings": {}, "active_mutes": {}, "member_activity": {}}
+            with open(DATA_FILE, "rb") as f:
+                raw = f.read()
+            _data_file_sig = _stat_sig(DATA_FILE)
+            data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+            # Ensure top-level keys exist
+            if "warnings" not in data:
+                data["warnings"] = {}
+            if "active_mutes" not in data:
+                data["active_mutes"] = {}
+            if "member_activity" not in data: # New key for member join/leave logs
+                data["member_activity"] = {}
+            replayed = replay_wal(data)
+            if replayed:
+                print(f"Replayed {replayed} operations from {WAL_FILE}.")
+            _reconcile_warning_counts(data)
+            return data
+        except ValueError:
+            # A pre-atomic-write file may be truncated; try the last temp
+            # snapshot before falling back to empty data.
+            data = None
+            tmp_path = DATA_FILE + ".tmp"
+            if os.path.exists(tmp_path):
+                try:
+                    with open(tmp_path, "rb") as f:
+                        raw = f.read()
+                    data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+                    print(f"Error decoding JSON from {DATA_FILE}. Recovered from {tmp_path}.")
+                except (ValueError, IOError):
+                    data = None
+            if data is None:
+                print(f"Error decoding JSON from {DATA_FILE}. Starting with empty data.")
+                data = {}
+            data.setdefault("warnings", {})
+            data.setdefault("active_mutes", {})
+            data.setdefault("member_activity", {})
+            replay_wal(data)
+            _reconcile_warning_counts(data)
+            return data
+    data = {"warnings": {}, "active_mutes": {}, "member_activity": {}}
+    replay_wal(data)
+    _reconcile_warning_counts(data)
+    return data
 
 def save_data(data):
-    """Saves warning data to the JSON file."""
+    """Saves warning data to the JSON file.
+
+    The snapshot is written to a temp file and renamed into place, so a kill
+    mid-write can never leave a truncated DATA_FILE behind (os.replace is
+    atomic on POSIX and NTFS)."""
+    tmp_path = DATA_FILE + ".tmp"
     try:
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4)
+        if orjson is not None:
+            with open(tmp_path, "wb") as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        else:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=4)
+        os.replace(tmp_path, DATA_FILE)
+        global _data_file_sig
+        _data_file_sig = _stat_sig(DATA_FILE)
         return True
     except IOError as e:
         print(f"Error saving data to {DATA_FILE}: {e}")
@@ -65,9 +155,203 @@ def save_data(data):
         print(f"Unexpected error saving data to {DATA_FILE}: {e}")
         return False
 
+def _build_case_index(data):
+    """Maps case_id -> (server_id, user_id, entry) for O(1) /clear lookups.
+
+    Built once per load; the warn/note paths insert new entries as they are
+    created so the index never needs a rescan."""
+    index = {}
+    for server_id, server_users in data.get("warnings", {}).items():
+        for user_id, user_data in server_users.items():
+            for entry in user_data.get("entries", []):
+                case_id = entry.get("case_id")
+                if case_id:
+                    index[case_id] = (server_id, user_id, entry)
+    return index
+
+# Async wrapper: the sync worker stays usable from threads and the compaction
+# path, while startup awaits this so a slow disk never stalls the gateway
+# heartbeat. Saves have no such wrapper — all hot-path persistence goes
+# through the WAL, and the remaining save_data calls run off-loop already.
+async def load_data_async():
+    return await asyncio.to_thread(load_data)
+
+# --- Write-Ahead Log ---
+# Hot paths (warn/mute/unmute) append one-line deltas to WAL_FILE instead of
+# rewriting the full snapshot; the snapshot is rewritten periodically by
+# compact_wal and the log replayed on top of it at startup.
+_wal_ops_since_compact = 0
+# append_wal and compact_wal both run on worker threads (asyncio.to_thread);
+# the lock keeps an append from landing between the snapshot write and the
+# log truncation, where it would be wiped without ever reaching the snapshot.
+_wal_lock = threading.Lock()
+
+def append_wal(op):
+    """Appends a single delta operation to the write-ahead log."""
+    global _wal_ops_since_compact
+    try:
+        with _wal_lock:
+            if orjson is not None:
+                with open(WAL_FILE, "ab") as f:
+                    f.write(orjson.dumps(op) + b"\n")
+            else:
+                with open(WAL_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            _wal_ops_since_compact += 1
+        return True
+    except Exception as e:
+        print(f"Error appending to WAL {WAL_FILE}: {e}")
+        return False
+
+def _apply_wal_op(data, op):
+    kind = op.get("op")
+    if kind in ("warn", "note"):
+        server_map = data["warnings"].setdefault(op["server"], {})
+        user_data = server_map.setdefault(op["user"], {"entries": [], "total_warnings": 0, "per_rule_violations": {}})
+        entries = user_data.setdefault("entries", [])
+        # Hot paths mutate warning_data in memory before the WAL append lands,
+        # so an append racing a compaction can end up in the fresh log while
+        # its entry is already in the snapshot. Case IDs are unique per entry;
+        # skip ops the snapshot already holds instead of duplicating them.
+        case_id = op["entry"].get("case_id")
+        if case_id and any(e.get("case_id") == case_id for e in entries):
+            return
+        entries.append(op["entry"])
+    elif kind == "clear":
+        user_data = data["warnings"].get(op["server"], {}).get(op["user"])
+        if user_data:
+            for entry in user_data.get("entries", []):
+                if entry.get("case_id") == op["case_id"]:
+                    entry.update(op.get("fields", {}))
+                    break
+    elif kind == "mute":
+        data["active_mutes"][op["key"]] = op["info"]
+    elif kind == "unmute":
+        for key in op.get("keys", []):
+            data["active_mutes"].pop(key, None)
+    elif kind == "member_activity":
+        server_map = data.setdefault("member_activity", {}).setdefault(op["server"], {})
+        events = server_map.setdefault(op["user"], [])
+        # Same replay-after-compaction dedupe as warn/note, keyed on the
+        # event_id the join/leave handlers stamp on each activity entry.
+        # Entries from before the tag existed have no event_id and append
+        # as before.
+        event_id = op["entry"].get("event_id")
+        if event_id and any(e.get("event_id") == event_id for e in events):
+            return
+        events.append(op["entry"])
+    else:
+        print(f"Unknown WAL op type: {kind!r}. Skipping.")
+
+def replay_wal(data):
+    """Replays logged deltas onto a freshly loaded snapshot. Returns the number
+    of operations applied."""
+    if not os.path.exists(WAL_FILE):
+        return 0
+    applied = 0
+    try:
+        with open(WAL_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    op = orjson.loads(line) if orjson is not None else json.loads(line)
+                except ValueError:
+                    print(f"Skipping corrupt WAL line: {line[:80]!r}")
+                    continue
+                _apply_wal_op(data, op)
+                applied += 1
+    except IOError as e:
+        print(f"Error reading WAL {WAL_FILE}: {e}")
+    return applied
+
+def compact_wal(data):
+    """Writes a full snapshot and truncates the write-ahead log.
+
+    Holds _wal_lock across both steps: an op appended between them would be
+    truncated away without being in the snapshot. An append that waits out
+    the compaction lands in the fresh log even though its mutation is already
+    in the snapshot (hot paths mutate warning_data in memory first), so
+    _apply_wal_op dedupes warn/note/member_activity by case_id/event_id at
+    replay; the remaining op kinds are naturally idempotent."""
+    global _wal_ops_since_compact
+    with _wal_lock:
+        if not save_data(data):
+            return False
+        try:
+            # Truncate with the same tmp + os.replace pattern as save_data:
+            # replace is atomic, so the log is never left half-truncated with
+            # ops the snapshot already contains (replaying warn/note ops twice
+            # would duplicate entries).
+            tmp_path = WAL_FILE + ".tmp"
+            open(tmp_path, "wb").close()
+            os.replace(tmp_path, WAL_FILE)
+            _wal_ops_since_compact = 0
+            return True
+        except IOError as e:
+            print(f"Error truncating WAL {WAL_FILE}: {e}")
+            return False
+
+# --- Rules Data ---
+def load_rules_data():
+    """Reads rules_database.json once; cogs consume the parsed dict via bot.rules_cache."""
+    try:
+        with open(RULES_DATA_FILE, "rb") as f:
+            raw = f.read()
+        data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        if not isinstance(data, dict):
+            print(f"ERROR: Rules data at {RULES_DATA_FILE} is not a valid JSON object. Using empty rules.")
+            return {"rules": [], "general_punishment_ladder": []}
+        data.setdefault("rules", [])
+        data.setdefault("general_punishment_ladder", [])
+        return data
+    except FileNotFoundError:
+        print(f"ERROR: Rules data file not found at {RULES_DATA_FILE}. Using empty rules.")
+        return {"rules": [], "general_punishment_ladder": []}
+    except ValueError as e:
+        print(f"ERROR: Could not decode JSON from {RULES_DATA_FILE}: {e}. Using empty rules.")
+        return {"rules": [], "general_punishment_ladder": []}
+
+def _rules_file_stat():
+    try:
+        stat = os.stat(RULES_DATA_FILE)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+@tasks.loop(minutes=5)
+async def rules_reload_loop():
+    """Reloads the rules only when the file's mtime/size actually changed.
+
+    The cached dict is updated in place so cogs holding a reference to
+    bot.rules_cache see the new rules without re-fetching it."""
+    sig = _rules_file_stat()
+    if sig is None or sig == bot._rules_stat:
+        return
+    new_rules = await asyncio.to_thread(load_rules_data)
+    bot._rules_stat = sig
+    cache = getattr(bot, "rules_cache", None)
+    if isinstance(cache, dict):
+        cache.clear()
+        cache.update(new_rules)
+    else:
+        bot.rules_cache = new_rules
+    warnings_cog = bot.get_cog("Warnings")
+    if warnings_cog is not None:
+        warnings_cog._index_rules_data()
+    history_cog = bot.get_cog("UserHistory")
+    if history_cog is not None:
+        history_cog._index_rules_data()
+    print(f"Reloaded rules data from {RULES_DATA_FILE} (file changed).")
+
 # --- Utility Functions ---
 def generate_case_id():
-    """Generates a unique 5-character alphanumeric case ID."""
+    """Generates a unique 5-character alphanumeric case ID.
+
+    IDs are always uppercase (A-Z, 0-9); lookups against bot.case_index rely
+    on this, so user-supplied IDs only need one .upper() at the command edge
+    instead of case-insensitive comparisons everywhere."""
     return "".join(random.choices(string.ascii_uppercase + string.digits, k=5))
 
 async def check_admin_role(interaction: discord.Interaction) -> bool:
@@ -77,8 +361,15 @@ async def check_admin_role(interaction: discord.Interaction) -> bool:
     await interaction.response.send_message("你不是管理员！", ephemeral=True)
     return False
 
+# discord.utils.get scans every role in the guild; cache the hit per guild
+# and let the role events below invalidate it.
+_muted_role_cache: dict[int, discord.Role] = {}
+
 async def get_muted_role(guild: discord.Guild) -> discord.Role | None:
     """Gets the Muted role, creating it if it doesn't exist and bot has perms."""
+    muted_role = _muted_role_cache.get(guild.id)
+    if muted_role is not None:
+        return muted_role
     muted_role = discord.utils.get(guild.roles, name=MUTED_ROLE_NAME)
     if not muted_role:
         if guild.me.guild_permissions.manage_roles and guild.me.guild_permissions.administrator:
@@ -91,12 +382,17 @@ async def get_muted_role(guild: discord.Guild) -> discord.Role | None:
                 )
                 muted_role = await guild.create_role(name=MUTED_ROLE_NAME, permissions=permissions, reason="For bot mute functionality")
                 print(f"Created '{MUTED_ROLE_NAME}' role in guild {guild.id}.")
-                # Configure overwrites for existing channels
-                for channel in guild.text_channels:
-                    await channel.set_permissions(muted_role, send_messages=False, add_reactions=False)
-                for channel in guild.voice_channels:
-                    await channel.set_permissions(muted_role, speak=False)
-                await asyncio.sleep(1) # Ensure role creation is processed
+                # Configure overwrites for existing channels concurrently;
+                # discord.py's HTTP layer queues them under the rate limit, so
+                # bootstrap takes ~one round of latency instead of one per channel.
+                overwrite_results = await asyncio.gather(
+                    *(c.set_permissions(muted_role, send_messages=False, add_reactions=False) for c in guild.text_channels),
+                    *(c.set_permissions(muted_role, speak=False) for c in guild.voice_channels),
+                    return_exceptions=True,
+                )
+                failed = sum(1 for r in overwrite_results if isinstance(r, BaseException))
+                if failed:
+                    print(f"Failed to set {failed} channel overwrites for '{MUTED_ROLE_NAME}' in guild {guild.id}.")
             except discord.Forbidden:
                 print(f"Forbidden to create '{MUTED_ROLE_NAME}' role in guild {guild.id}.")
                 return None
@@ -106,8 +402,24 @@ async def get_muted_role(guild: discord.Guild) -> discord.Role | None:
         else:
             print(f"Bot lacks permissions to create '{MUTED_ROLE_NAME}' role in guild {guild.id}.")
             return None
+    _muted_role_cache[guild.id] = muted_role
     return muted_role
 
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    if _muted_role_cache.get(role.guild.id) == role:
+        del _muted_role_cache[role.guild.id]
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    cached = _muted_role_cache.get(after.guild.id)
+    if cached is not None and cached.id == after.id:
+        if after.name == MUTED_ROLE_NAME:
+            _muted_role_cache[after.guild.id] = after
+        else:
+            # Renamed away from the Muted role; drop it so the next lookup rescans.
+            del _muted_role_cache[after.guild.id]
+
 # --- Event Handlers ---
 @bot.event
 async def on_ready():
@@ -115,8 +427,11 @@ async def on_ready():
     print(f"Logged in as {bot.user.name} (ID: {bot.user.id})")
     print("Bot is ready and listening for commands.")
     print("------")
-    # Load data and start background tasks if any (mute handler will be in warnings.py)
-    bot.warning_data = load_data()
+    # setup_hook already loaded the data; on_ready also fires on reconnects,
+    # so only load here if that somehow hasn't happened yet.
+    if not hasattr(bot, "warning_data"):
+        bot.warning_data = await load_data_async()
+        bot.case_index = _build_case_index(bot.warning_data)
     # The actual mute task loop will be started from warnings.py after cog loading
 
 @bot.event
@@ -124,13 +439,15 @@ async def on_member_join(member: discord.Member):
     """Called when a member joins the guild."""
     server_id = str(member.guild.id)
     user_id = str(member.id)
-    timestamp = int(datetime.now(timezone.utc).timestamp())
+    timestamp = int(time.time())
 
     activity_entry = {
         "type": "join",
         "timestamp": timestamp,
         "user_id": user_id,
-        "guild_id": server_id
+        "guild_id": server_id,
+        # 去重标记：WAL重放时据此跳过快照中已有的记录
+        "event_id": f"{timestamp}-{generate_case_id()}"
     }
 
     # 确保所有必要的字典键都已初始化
@@ -147,7 +464,9 @@ async def on_member_join(member: discord.Member):
         bot.warning_data["member_activity"][server_id][user_id] = []
     
     bot.warning_data["member_activity"][server_id][user_id].append(activity_entry)
-    save_data(bot.warning_data)
+    # One-line WAL append instead of rewriting the whole snapshot; join floods
+    # cost O(one entry) of disk each instead of O(total data).
+    await asyncio.to_thread(append_wal, {"op": "member_activity", "server": server_id, "user": user_id, "entry": activity_entry})
     print(f"Member {member.display_name} (ID: {user_id}) joined guild {member.guild.name} (ID: {server_id}). Event logged.")
 
 @bot.event
@@ -155,13 +474,15 @@ async def on_member_remove(member: discord.Member):
     """Called when a member leaves or is removed from the guild."""
     server_id = str(member.guild.id)
     user_id = str(member.id)
-    timestamp = int(datetime.now(timezone.utc).timestamp())
+    timestamp = int(time.time())
 
     activity_entry = {
         "type": "leave",
         "timestamp": timestamp,
         "user_id": user_id,
-        "guild_id": server_id
+        "guild_id": server_id,
+        # 去重标记：WAL重放时据此跳过快照中已有的记录
+        "event_id": f"{timestamp}-{generate_case_id()}"
     }
 
     # 确保所有必要的字典键都已初始化
@@ -178,17 +499,40 @@ async def on_member_remove(member: discord.Member):
         bot.warning_data["member_activity"][server_id][user_id] = []
     
     bot.warning_data["member_activity"][server_id][user_id].append(activity_entry)
-    save_data(bot.warning_data)
+    await asyncio.to_thread(append_wal, {"op": "member_activity", "server": server_id, "user": user_id, "entry": activity_entry})
     print(f"Member {member.display_name} (ID: {user_id}) left guild {member.guild.name} (ID: {server_id}). Event logged.")
 
+@tasks.loop(minutes=5)
+async def wal_compact_loop():
+    """Periodically folds accumulated WAL deltas into a fresh snapshot."""
+    if _wal_ops_since_compact:
+        await asyncio.to_thread(compact_wal, bot.warning_data)
+
 @bot.event
 async def setup_hook():
     """Asynchronously called after login but before connecting to the Websocket."""
     print("Running setup_hook...")
-    bot.warning_data = load_data() # Load data early
+    bot.warning_data = await load_data_async() # Load data early
+    bot.case_index = _build_case_index(bot.warning_data)
+
+    # Fold any deltas replayed from the WAL into a fresh snapshot, then keep
+    # compacting periodically in the background.
+    if os.path.exists(WAL_FILE) and os.path.getsize(WAL_FILE) > 0:
+        await asyncio.to_thread(compact_wal, bot.warning_data)
+    if not wal_compact_loop.is_running():
+        wal_compact_loop.start()
+
+    # Parse the rules file once here; both cogs pick the dict up from
+    # bot.rules_cache instead of each re-reading the file at cog load.
+    bot.rules_cache = await asyncio.to_thread(load_rules_data)
+    bot._rules_stat = _rules_file_stat()
+    if not rules_reload_loop.is_running():
+        rules_reload_loop.start()
     
     # 添加必要的方法到bot对象，确保其他cog可以访问
     bot.save_data = save_data
+    bot.append_wal = append_wal
+    bot.compact_wal = compact_wal
     bot.generate_case_id = generate_case_id
     bot.check_admin_role = check_admin_role
     bot.get_muted_role = get_muted_role
@@ -198,24 +542,29 @@ async def setup_hook():
     bot.HISTORY_CHANNEL_ID = HISTORY_CHANNEL_ID
     bot.MUTED_ROLE_NAME = MUTED_ROLE_NAME
     bot.VERIFIED_ROLE_ID = VERIFIED_ROLE_ID
+    bot.USE_NATIVE_TIMEOUT = USE_NATIVE_TIMEOUT
     bot.RULES_DATA_FILE = RULES_DATA_FILE
 
-    # Load cogs (extensions)
-    try:
-        await bot.load_extension("bot_warnings_cog")
-        print("Loaded 'bot_warnings_cog' extension.")
-        await bot.load_extension("userhistory")
-        print("Loaded 'userhistory' extension.")
-    except commands.ExtensionNotFound as e:
-        print(f"Error loading extension: {e} - Make sure the file exists and is in the correct path.")
-    except commands.ExtensionAlreadyLoaded as e:
-        print(f"Extension already loaded: {e}")
-    except commands.NoEntryPointError as e:
-        print(f"Extension has no setup function: {e}")
-    except commands.ExtensionFailed as e:
-        print(f"Extension setup failed: {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred during extension loading: {e}")
+    # Load cogs (extensions) concurrently; they are independent, so setup
+    # time approaches the slowest load instead of the sum of both.
+    extensions = ("bot_warnings_cog", "userhistory")
+    results = await asyncio.gather(
+        *(bot.load_extension(name) for name in extensions),
+        return_exceptions=True,
+    )
+    for name, result in zip(extensions, results):
+        if result is None:
+            print(f"Loaded '{name}' extension.")
+        elif isinstance(result, commands.ExtensionNotFound):
+            print(f"Error loading extension: {result} - Make sure the file exists and is in the correct path.")
+        elif isinstance(result, commands.ExtensionAlreadyLoaded):
+            print(f"Extension already loaded: {result}")
+        elif isinstance(result, commands.NoEntryPointError):
+            print(f"Extension has no setup function: {result}")
+        elif isinstance(result, commands.ExtensionFailed):
+            print(f"Extension setup failed: {result}")
+        else:
+            print(f"An unexpected error occurred during extension loading: {result}")
 
     # Sync application commands
     # It's generally better to sync commands after cogs are loaded, 
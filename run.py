@@ -4,6 +4,14 @@ from dotenv import load_dotenv
 # 加载.env文件中的环境变量（如果存在）
 load_dotenv()
 
+# 使用uvloop事件循环（如果已安装）：降低socket/定时器的系统调用开销。
+# bot.run内部调用asyncio.run，因此必须在运行前设置事件循环策略。
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 # 导入主程序
 from main import bot, TOKEN
 
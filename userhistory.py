@@ -6,40 +6,108 @@ import discord
 from discord.ext import commands, tasks
 from discord import app_commands
 import asyncio
+import collections
 import json
+import time
 from datetime import datetime, timezone
 import traceback
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# /userhistory渲染时各记录类型对应的 (类型名, 内容标签, 固定内容)；
+# 固定内容为None的类型从记录自身取文本
+_TYPE_LABELS = {
+    "warning": ("警告", "理由", None),
+    "note": ("备注", "内容", None),
+    "join_event": ("加入服务器", "内容", "用户加入了服务器。"),
+    "leave_event": ("离开服务器", "内容", "用户离开了服务器。"),
+}
+
 class UserHistoryCog(commands.Cog, name="UserHistory"):
+    # 每用户互斥锁表的上限；超过后按LRU淘汰未持有的锁
+    _USER_LOCK_CAP = 4096
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        # 尝试加载rules_data
-        self.rules_data = self._load_rules_data()
+        self.rules_data = {"rules": [], "general_punishment_ladder": []}
+        self._index_rules_data()
+        self._user_locks: collections.OrderedDict[str, asyncio.Lock] = collections.OrderedDict()
+        # Strong refs to detached tasks so the event loop cannot GC them mid-run
+        self._detached_tasks: set[asyncio.Task] = set()
+
+    async def cog_load(self):
+        """加载规则数据，确保在_handle_unmute_due_to_clear中可用。
+
+        The rules dict is cached on the bot, so when WarningsCog already loaded
+        it this is a dict lookup instead of a second file read."""
+        cached = getattr(self.bot, "rules_cache", None)
+        if cached is None:
+            cached = await asyncio.to_thread(self._load_rules_data)
+            self.bot.rules_cache = cached
+        self.rules_data = cached
+        self._index_rules_data()
+
+    def _lock_for(self, server_id: str, user_id: str) -> asyncio.Lock:
+        """Returns the mutation lock for one (guild, user) record.
+
+        note/clear check state and then mutate it across awaits; without the
+        lock two concurrent commands on the same user can double-decrement
+        counters or fire the unmute flow twice.
+
+        The table is an LRU bounded at _USER_LOCK_CAP so it does not grow with
+        every user the bot has ever touched; locks that are currently held are
+        never evicted."""
+        key = f"{server_id}-{user_id}"
+        lock = self._user_locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._user_locks[key] = lock
+            if len(self._user_locks) > self._USER_LOCK_CAP:
+                for old_key, old_lock in list(self._user_locks.items()):
+                    if len(self._user_locks) <= self._USER_LOCK_CAP:
+                        break
+                    if old_key != key and not old_lock.locked():
+                        del self._user_locks[old_key]
+        else:
+            self._user_locks.move_to_end(key)
+        return lock
+
+    def _index_rules_data(self):
+        """Pre-sorts the punishment ladder; the rules only change on reload,
+        so the per-clear sorted() call is unnecessary."""
+        self._ladder_desc = sorted(
+            self.rules_data.get("general_punishment_ladder", []),
+            key=lambda x: x.get("threshold", 0),
+            reverse=True,
+        )
 
     def _load_rules_data(self):
-        """加载规则数据，确保在_handle_unmute_due_to_clear中可用"""
         try:
-            with open(self.bot.RULES_DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                # 验证规则数据的基本结构
-                if not isinstance(data, dict):
-                    print(f"ERROR: Rules data at {self.bot.RULES_DATA_FILE} is not a valid JSON object. Returning empty rules.")
-                    return {"rules": [], "general_punishment_ladder": []}
-                
-                # 确保必要的键存在
-                if "rules" not in data:
-                    print(f"WARNING: Rules data at {self.bot.RULES_DATA_FILE} is missing 'rules' key. Adding empty rules list.")
-                    data["rules"] = []
-                
-                if "general_punishment_ladder" not in data:
-                    print(f"WARNING: Rules data at {self.bot.RULES_DATA_FILE} is missing 'general_punishment_ladder' key. Adding empty ladder.")
-                    data["general_punishment_ladder"] = []
-                
-                return data
+            with open(self.bot.RULES_DATA_FILE, "rb") as f:
+                raw = f.read()
+            data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+            # 验证规则数据的基本结构
+            if not isinstance(data, dict):
+                print(f"ERROR: Rules data at {self.bot.RULES_DATA_FILE} is not a valid JSON object. Returning empty rules.")
+                return {"rules": [], "general_punishment_ladder": []}
+
+            # 确保必要的键存在
+            if "rules" not in data:
+                print(f"WARNING: Rules data at {self.bot.RULES_DATA_FILE} is missing 'rules' key. Adding empty rules list.")
+                data["rules"] = []
+
+            if "general_punishment_ladder" not in data:
+                print(f"WARNING: Rules data at {self.bot.RULES_DATA_FILE} is missing 'general_punishment_ladder' key. Adding empty ladder.")
+                data["general_punishment_ladder"] = []
+
+            return data
         except FileNotFoundError:
             print(f"ERROR: Rules data file not found at {self.bot.RULES_DATA_FILE}. Returning empty rules.")
             return {"rules": [], "general_punishment_ladder": []}
-        except json.JSONDecodeError as e:
+        except ValueError as e:
             print(f"ERROR: Could not decode JSON from {self.bot.RULES_DATA_FILE}: {e}. Returning empty rules.")
             return {"rules": [], "general_punishment_ladder": []}
         except AttributeError:
@@ -55,84 +123,120 @@ class UserHistoryCog(commands.Cog, name="UserHistory"):
         user_id = str(member.id)
         mute_key = f"{server_id}-{user_id}"
 
-        user_warnings_data = self.bot.warning_data.get("warnings", {}).get(server_id, {}).get(user_id, {})
-        active_warning_count = sum(1 for entry in user_warnings_data.get("entries", []) if entry.get("entry_type") == "warning" and entry.get("status") != "cleared")
-        
+        # Most clears are for users who are not muted; bail out before the
+        # count read and ladder walk in that common case. Native timeouts
+        # don't create an active_mutes entry, so the member's timeout state
+        # has to be checked too before concluding there is nothing to lift.
+        active_mutes = self.bot.warning_data["active_mutes"]
+        active_mute_entry = active_mutes.get(mute_key)
+        if active_mute_entry is None and not member.is_timed_out():
+            return
+
+        # load_data guarantees the top-level keys, so bind them directly
+        # instead of chaining .get() calls that allocate fallback dicts.
+        guild_warnings = self.bot.warning_data["warnings"].get(server_id)
+        user_warnings_data = guild_warnings.get(user_id) if guild_warnings else None
+        # total_warnings counts active warnings only: it is reconciled from the
+        # entries at load time and maintained incrementally by warn/clear.
+        active_warning_count = user_warnings_data.get("total_warnings", 0) if user_warnings_data else 0
+
         print(f"[Unmute Check for {member.display_name}] Active warnings after clear: {active_warning_count}")
 
-        if mute_key in self.bot.warning_data.get("active_mutes", {}):
-            active_mute_entry = self.bot.warning_data["active_mutes"][mute_key]
-            # Check if the specific case ID that triggered the mute is among those cleared or if total count drops
-            # For simplicity, we'll re-evaluate based on current active warning count vs punishment ladder.
-            # This assumes the punishment ladder is accessible or the logic is self-contained here.
-            # The original logic used new_total_warnings < 2. We'll use active_warning_count.
-            
-            # Determine the current punishment level based on active_warning_count
-            should_unmute = True # Default to true if mute exists and we are re-evaluating
-            
-            # Find the relevant punishment from the ladder based on `active_warning_count`
-            general_punishments_config = self.rules_data.get("general_punishment_ladder", [])
-            current_punishment_level_action = None
-            for pun_def in sorted(general_punishments_config, key=lambda x: x.get("threshold", 0), reverse=True):
-                if active_warning_count >= pun_def.get("threshold", 0):
-                    current_punishment_level_action = pun_def.get("action")
-                    break
-            
+        # Check if the specific case ID that triggered the mute is among those cleared or if total count drops
+        # For simplicity, we'll re-evaluate based on current active warning count vs punishment ladder.
+        # This assumes the punishment ladder is accessible or the logic is self-contained here.
+        # The original logic used new_total_warnings < 2. We'll use active_warning_count.
+
+        # Determine the current punishment level based on active_warning_count
+        should_unmute = True # Default to true if mute exists and we are re-evaluating
+
+        # Find the relevant punishment from the ladder based on `active_warning_count`
+        current_punishment_level_action = None
+        for pun_def in self._ladder_desc:
+            if active_warning_count >= pun_def.get("threshold", 0):
+                current_punishment_level_action = pun_def.get("action")
+                break
+
+        if active_mute_entry is None:
+            # Native-timeout path: there is no role or active_mutes bookkeeping
+            # to undo, just the Discord-side timeout to lift once the remaining
+            # warnings no longer warrant a mute.
             if current_punishment_level_action == "mute":
-                print(f"[Unmute Check for {member.display_name}] Still meets mute criteria based on {active_warning_count} active warnings.")
-                should_unmute = False
-                # Update case_ids for the mute if this one was part of it
-                if case_id_cleared in active_mute_entry.get("case_ids_for_mute", []):
-                    active_mute_entry["case_ids_for_mute"].remove(case_id_cleared)
-                    if not active_mute_entry["case_ids_for_mute"]:
-                        # If this was the only warning causing the mute, and now it's cleared, but they still meet criteria by count, this is tricky.
-                        # The mute should ideally be tied to specific warning instances or a re-evaluation of the mute duration.
-                        # For now, if case_ids_for_mute becomes empty, but they still qualify for a mute, the mute remains.
-                        pass # Mute remains based on count
-                    save_result = self.bot.save_data(self.bot.warning_data)
+                await interaction_for_followup.followup.send(f"记录 Case ID `{case_id_cleared}` 已为用户 {member.mention} 清除。他们当前仍处于禁言状态 (剩余 {active_warning_count} 次有效警告)。", ephemeral=True)
+                return
+            try:
+                await member.timeout(None, reason=f"Mute lifted due to record clear (Case ID: {case_id_cleared})")
+                await interaction_for_followup.followup.send(f"{member.mention} 的禁言已因记录清除 (Case ID: {case_id_cleared}) 而解除。", ephemeral=True)
+                history_channel = self.bot.get_channel(self.bot.HISTORY_CHANNEL_ID)
+                if history_channel:
+                    await history_channel.send(f"{member.mention} ({member.id}) 的禁言已因管理记录 (Case ID: {case_id_cleared}) 被清除而解除。")
+            except discord.Forbidden:
+                await interaction_for_followup.followup.send(f"记录已清除，但机器人权限不足以解除 {member.mention} 的禁言。", ephemeral=True)
+            except discord.HTTPException as e:
+                await interaction_for_followup.followup.send(f"记录已清除，但在尝试解除 {member.mention} 禁言时发生HTTP错误: {e}", ephemeral=True)
+            return
+
+        if current_punishment_level_action == "mute":
+            print(f"[Unmute Check for {member.display_name}] Still meets mute criteria based on {active_warning_count} active warnings.")
+            should_unmute = False
+            # Update case_ids for the mute if this one was part of it
+            if case_id_cleared in active_mute_entry.get("case_ids_for_mute", []):
+                active_mute_entry["case_ids_for_mute"].remove(case_id_cleared)
+                if not active_mute_entry["case_ids_for_mute"]:
+                    # If this was the only warning causing the mute, and now it's cleared, but they still meet criteria by count, this is tricky.
+                    # The mute should ideally be tied to specific warning instances or a re-evaluation of the mute duration.
+                    # For now, if case_ids_for_mute becomes empty, but they still qualify for a mute, the mute remains.
+                    pass # Mute remains based on count
+                save_result = await asyncio.to_thread(
+                    self.bot.append_wal, {"op": "mute", "key": mute_key, "info": active_mute_entry}
+                )
+                if not save_result:
+                    print(f"[Unmute Check] Failed to save data after updating case_ids_for_mute for {member.display_name}")
+        else:
+            print(f"[Unmute Check for {member.display_name}] No longer meets mute criteria based on {active_warning_count} active warnings.")
+            should_unmute = True
+
+        if should_unmute:
+            muted_role = await self.bot.get_muted_role(guild)
+            if not muted_role:
+                await interaction_for_followup.followup.send(f"记录已清除，但无法找到Muted角色以执行自动解禁。", ephemeral=True)
+                return
+            try:
+                if muted_role in member.roles:
+                    # Drop the muted role and restore verified in one
+                    # Modify Guild Member call instead of two PATCHes.
+                    verified_role = guild.get_role(self.bot.VERIFIED_ROLE_ID)
+                    new_roles = [r for r in member.roles if r.id != muted_role.id]
+                    if verified_role and verified_role not in new_roles:
+                        new_roles.append(verified_role)
+                    await member.edit(roles=new_roles, reason=f"Mute lifted due to record clear (Case ID: {case_id_cleared})")
+
+                    del self.bot.warning_data["active_mutes"][mute_key]
+                    save_result = await asyncio.to_thread(
+                        self.bot.append_wal, {"op": "unmute", "keys": [mute_key]}
+                    )
                     if not save_result:
-                        print(f"[Unmute Check] Failed to save data after updating case_ids_for_mute for {member.display_name}")
-            else:
-                print(f"[Unmute Check for {member.display_name}] No longer meets mute criteria based on {active_warning_count} active warnings.")
-                should_unmute = True
-
-            if should_unmute:
-                muted_role = await self.bot.get_muted_role(guild)
-                if not muted_role:
-                    await interaction_for_followup.followup.send(f"记录已清除，但无法找到Muted角色以执行自动解禁。", ephemeral=True)
-                    return
-                try:
-                    if muted_role in member.roles:
-                        await member.remove_roles(muted_role, reason=f"Mute lifted due to record clear (Case ID: {case_id_cleared})")
-                        verified_role = guild.get_role(self.bot.VERIFIED_ROLE_ID)
-                        if verified_role:
-                            await member.add_roles(verified_role, reason="Mute lifted, restoring verified role")
-                        
+                        print(f"[Unmute Check] Failed to save data after unmuting {member.display_name}")
+
+                    await interaction_for_followup.followup.send(f"{member.mention} 的禁言已因记录清除 (Case ID: {case_id_cleared}) 而解除。他们的认证角色（如果适用）已恢复。", ephemeral=True)
+                    history_channel = self.bot.get_channel(self.bot.HISTORY_CHANNEL_ID)
+                    if history_channel:
+                        await history_channel.send(f"{member.mention} ({member.id}) 的禁言已因管理记录 (Case ID: {case_id_cleared}) 被清除而解除。")
+                else:
+                    if mute_key in self.bot.warning_data["active_mutes"]:
                         del self.bot.warning_data["active_mutes"][mute_key]
-                        save_result = self.bot.save_data(self.bot.warning_data)
+                        save_result = await asyncio.to_thread(
+                            self.bot.append_wal, {"op": "unmute", "keys": [mute_key]}
+                        )
                         if not save_result:
-                            print(f"[Unmute Check] Failed to save data after unmuting {member.display_name}")
-                            
-                        await interaction_for_followup.followup.send(f"{member.mention} 的禁言已因记录清除 (Case ID: {case_id_cleared}) 而解除。他们的认证角色（如果适用）已恢复。", ephemeral=True)
-                        history_channel = self.bot.get_channel(self.bot.HISTORY_CHANNEL_ID)
-                        if history_channel:
-                            await history_channel.send(f"{member.mention} ({member.id}) 的禁言已因管理记录 (Case ID: {case_id_cleared}) 被清除而解除。")
-                    else:
-                        if mute_key in self.bot.warning_data["active_mutes"]:
-                            del self.bot.warning_data["active_mutes"][mute_key]
-                            save_result = self.bot.save_data(self.bot.warning_data)
-                            if not save_result:
-                                print(f"[Unmute Check] Failed to save data after removing mute entry for {member.display_name}")
-                        await interaction_for_followup.followup.send(f"记录已清除。用户已不在禁言状态或数据不一致。", ephemeral=True)
-                except discord.Forbidden:
-                    await interaction_for_followup.followup.send(f"记录已清除，但机器人权限不足以解除 {member.mention} 的禁言或恢复角色。", ephemeral=True)
-                except discord.HTTPException as e:
-                    await interaction_for_followup.followup.send(f"记录已清除，但在尝试解除 {member.mention} 禁言时发生HTTP错误: {e}", ephemeral=True)
-            else:
-                 await interaction_for_followup.followup.send(f"记录 Case ID `{case_id_cleared}` 已为用户 {member.mention} 清除。他们当前仍处于禁言状态 (剩余 {active_warning_count} 次有效警告)。", ephemeral=True)
+                            print(f"[Unmute Check] Failed to save data after removing mute entry for {member.display_name}")
+                    await interaction_for_followup.followup.send(f"记录已清除。用户已不在禁言状态或数据不一致。", ephemeral=True)
+            except discord.Forbidden:
+                await interaction_for_followup.followup.send(f"记录已清除，但机器人权限不足以解除 {member.mention} 的禁言或恢复角色。", ephemeral=True)
+            except discord.HTTPException as e:
+                await interaction_for_followup.followup.send(f"记录已清除，但在尝试解除 {member.mention} 禁言时发生HTTP错误: {e}", ephemeral=True)
         else:
-            # Not currently muted by the bot's active_mutes system
-            pass
+            await interaction_for_followup.followup.send(f"记录 Case ID `{case_id_cleared}` 已为用户 {member.mention} 清除。他们当前仍处于禁言状态 (剩余 {active_warning_count} 次有效警告)。", ephemeral=True)
 
     @app_commands.command(name="note", description="为用户添加一条管理备注。")
     @app_commands.describe(member="要添加备注的用户", text="备注内容")
@@ -145,7 +249,7 @@ class UserHistoryCog(commands.Cog, name="UserHistory"):
         server_id = str(interaction.guild.id)
         user_id = str(member.id)
         case_id = self.bot.generate_case_id()
-        timestamp = int(datetime.now(timezone.utc).timestamp())
+        timestamp = int(time.time())
         operator_id = str(interaction.user.id)
         operator_name = interaction.user.display_name
 
@@ -159,12 +263,18 @@ class UserHistoryCog(commands.Cog, name="UserHistory"):
             "status": "active" # active, cleared
         }
 
-        if server_id not in self.bot.warning_data["warnings"]: self.bot.warning_data["warnings"][server_id] = {}
-        if user_id not in self.bot.warning_data["warnings"][server_id]:
-            self.bot.warning_data["warnings"][server_id][user_id] = {"entries": [], "total_warnings": 0, "per_rule_violations": {}}
-        
-        self.bot.warning_data["warnings"][server_id][user_id]["entries"].append(note_entry)
-        save_result = self.bot.save_data(self.bot.warning_data)
+        async with self._lock_for(server_id, user_id):
+            if server_id not in self.bot.warning_data["warnings"]: self.bot.warning_data["warnings"][server_id] = {}
+            if user_id not in self.bot.warning_data["warnings"][server_id]:
+                self.bot.warning_data["warnings"][server_id][user_id] = {"entries": [], "total_warnings": 0, "per_rule_violations": {}}
+
+            self.bot.warning_data["warnings"][server_id][user_id]["entries"].append(note_entry)
+            self.bot.case_index[case_id] = (server_id, user_id, note_entry)
+            # Append the single note to the WAL instead of rewriting the snapshot.
+            save_result = await asyncio.to_thread(
+                self.bot.append_wal,
+                {"op": "note", "server": server_id, "user": user_id, "entry": note_entry}
+            )
         
         if not save_result:
             await interaction.followup.send(f"警告：保存备注数据时发生错误。备注可能不会持久保存。", ephemeral=True)
@@ -180,44 +290,50 @@ class UserHistoryCog(commands.Cog, name="UserHistory"):
         await interaction.response.defer(ephemeral=True, thinking=True)
 
         server_id = str(interaction.guild.id)
-        found_entry = False
-        target_user_id = None
-        entry_to_clear = None
-        original_message_id_history = None
-        entry_type = None
 
-        if server_id not in self.bot.warning_data.get("warnings", {}):
+        if server_id not in self.bot.warning_data["warnings"]:
             await interaction.followup.send(f"Case ID `{case_id}` 不存在 (服务器无记录)。", ephemeral=True)
             return
 
         # 统一大写处理case_id
         case_id = case_id.upper()
 
-        for user_id_str, user_data in self.bot.warning_data["warnings"][server_id].items():
-            for entry in user_data.get("entries", []):
-                if entry.get("case_id") == case_id and entry.get("status", "active") == "active":
-                    entry_to_clear = entry
-                    target_user_id = user_id_str
-                    entry_type = entry.get("entry_type", "unknown")
-                    original_message_id_history = entry.get("message_id_history_channel") # For warnings
-                    
-                    entry["status"] = "cleared"
-                    entry["cleared_timestamp"] = int(datetime.now(timezone.utc).timestamp())
-                    entry["cleared_by_operator_id"] = str(interaction.user.id)
-                    entry["cleared_by_operator_name"] = interaction.user.display_name
-                    found_entry = True
-                    break
-            if found_entry:
-                break
+        # The case index maps case_id straight to its entry, so /clear is a
+        # dict lookup instead of a scan over every user's history.
+        hit = self.bot.case_index.get(case_id)
+        if not hit or hit[0] != server_id or hit[2].get("status", "active") != "active":
+            await interaction.followup.send(f"有效的 Case ID `{case_id}` 未找到或已被清除。", ephemeral=True)
+            return
+
+        _, target_user_id, entry_to_clear = hit
+
+        # Serialize per (guild, user): two concurrent /clear calls on the same
+        # user must not double-decrement counters or double-fire the unmute.
+        async with self._lock_for(server_id, target_user_id):
+            await self._apply_clear(interaction, server_id, target_user_id, entry_to_clear, case_id)
 
-        if not found_entry or not target_user_id:
+    async def _apply_clear(self, interaction: discord.Interaction, server_id: str, target_user_id: str, entry_to_clear: dict, case_id: str):
+        """Runs the actual clear mutation; caller holds the per-user lock."""
+        # Re-check under the lock: a concurrent clear may have won the race
+        # between the index lookup and acquiring the lock.
+        if entry_to_clear.get("status", "active") != "active":
             await interaction.followup.send(f"有效的 Case ID `{case_id}` 未找到或已被清除。", ephemeral=True)
             return
 
+        entry_type = entry_to_clear.get("entry_type", "unknown")
+        original_message_id_history = entry_to_clear.get("message_id_history_channel") # For warnings
+
+        entry_to_clear["status"] = "cleared"
+        entry_to_clear["cleared_timestamp"] = int(time.time())
+        entry_to_clear["cleared_by_operator_id"] = str(interaction.user.id)
+        entry_to_clear["cleared_by_operator_name"] = interaction.user.display_name
+
         # If it was a warning, update counts
         if entry_type == "warning":
             user_data = self.bot.warning_data["warnings"][server_id][target_user_id]
-            user_data["total_warnings"] = sum(1 for e in user_data.get("entries", []) if e.get("entry_type") == "warning" and e.get("status", "active") == "active")
+            # Exactly one warning just went from active to cleared, so a
+            # decrement keeps the cached count correct without re-summing.
+            user_data["total_warnings"] = max(0, user_data.get("total_warnings", 0) - 1)
             
             # Update per_rule_violations
             if "rule_id_matched" in entry_to_clear and entry_to_clear["rule_id_matched"]:
@@ -230,15 +346,23 @@ class UserHistoryCog(commands.Cog, name="UserHistory"):
             history_channel = self.bot.get_channel(self.bot.HISTORY_CHANNEL_ID)
             if history_channel and original_message_id_history:
                 try:
-                    history_msg = await history_channel.fetch_message(original_message_id_history)
-                    edited_embed = history_msg.embeds[0] if history_msg.embeds else discord.Embed(description="原始消息无Embed")
-                    description_suffix = f"\n**此警告已由 {interaction.user.mention} 于 <t:{entry['cleared_timestamp']}:f> 清除。**"
+                    stored_embed = entry_to_clear.get("history_embed")
+                    if stored_embed:
+                        # The warn path stores the embed's dict form, so the
+                        # edit needs only one PATCH instead of fetch + edit.
+                        edited_embed = discord.Embed.from_dict(stored_embed)
+                    else:
+                        # Entries from before the embed was persisted still
+                        # need the fetch to recover the original content.
+                        history_msg = await history_channel.fetch_message(original_message_id_history)
+                        edited_embed = history_msg.embeds[0] if history_msg.embeds else discord.Embed(description="原始消息无Embed")
+                    description_suffix = f"\n**此警告已由 {interaction.user.mention} 于 <t:{entry_to_clear['cleared_timestamp']}:f> 清除。**"
                     if edited_embed.description:
                         edited_embed.description += description_suffix
                     else:
                         edited_embed.description = description_suffix
                     edited_embed.color = discord.Color.dark_grey()
-                    await history_msg.edit(embed=edited_embed)
+                    await history_channel.get_partial_message(original_message_id_history).edit(embed=edited_embed)
                 except discord.NotFound:
                     print(f"History message for case {case_id} (ID: {original_message_id_history}) not found.")
                 except discord.Forbidden:
@@ -246,7 +370,19 @@ class UserHistoryCog(commands.Cog, name="UserHistory"):
                 except Exception as e:
                     print(f"Error editing history message for case {case_id}: {e}")
 
-        save_result = self.bot.save_data(self.bot.warning_data)
+        # Log only the cleared fields; replay re-applies them onto the entry.
+        save_result = await asyncio.to_thread(
+            self.bot.append_wal,
+            {
+                "op": "clear", "server": server_id, "user": target_user_id, "case_id": case_id,
+                "fields": {
+                    "status": "cleared",
+                    "cleared_timestamp": entry_to_clear["cleared_timestamp"],
+                    "cleared_by_operator_id": entry_to_clear["cleared_by_operator_id"],
+                    "cleared_by_operator_name": entry_to_clear["cleared_by_operator_name"],
+                },
+            },
+        )
         if not save_result:
             await interaction.followup.send(f"警告：保存清除记录时发生错误。清除操作可能不会持久保存。", ephemeral=True)
             print(f"Error saving data after clearing record (Case ID: {case_id}) for user ID {target_user_id} in guild {interaction.guild.name} (ID: {server_id}).")
@@ -257,14 +393,29 @@ class UserHistoryCog(commands.Cog, name="UserHistory"):
             return
 
         if entry_type == "warning":
-            await self._handle_unmute_due_to_clear(interaction.guild, target_member, interaction, case_id)
-            # If _handle_unmute_due_to_clear sends its own followup, we might not need another one here.
-            # However, it's safer to have a general confirmation if no specific unmute message was sent.
-            if not interaction.response.is_done(): # Check if a response hasn't been sent by unmute logic
-                 await interaction.followup.send(f"警告记录 Case ID `{case_id}` 已为用户 {target_member.mention} 清除。", ephemeral=True)
+            # Confirm right away; the unmute evaluation involves extra Discord
+            # round-trips (role edits, notifications) and runs detached so the
+            # command returns as soon as the record itself is cleared.
+            await interaction.followup.send(f"警告记录 Case ID `{case_id}` 已为用户 {target_member.mention} 清除。", ephemeral=True)
+            task = asyncio.create_task(self._unmute_after_clear(interaction, server_id, target_user_id, target_member, case_id))
+            self._detached_tasks.add(task)
+            task.add_done_callback(self._detached_tasks.discard)
         else: # It was a note or other type
             await interaction.followup.send(f"备注记录 Case ID `{case_id}` 已为用户 {target_member.mention} 清除。", ephemeral=True)
 
+    async def _unmute_after_clear(self, interaction: discord.Interaction, server_id: str, target_user_id: str, target_member: discord.Member, case_id: str):
+        """Detached tail of a warning clear: re-acquires the per-user lock and
+        re-evaluates the mute state without blocking the /clear response.
+
+        The interaction's followup webhook stays valid for 15 minutes, so the
+        notifications sent inside _handle_unmute_due_to_clear still go through
+        from here."""
+        try:
+            async with self._lock_for(server_id, target_user_id):
+                await self._handle_unmute_due_to_clear(interaction.guild, target_member, interaction, case_id)
+        except Exception as e:
+            print(f"Error in detached unmute evaluation for case {case_id}: {e}")
+
     @app_commands.command(name="userhistory", description="查询用户的管理记录 (警告和备注)。")
     @app_commands.describe(member="要查询历史的用户")
     async def userhistory_slash_command(self, interaction: discord.Interaction, member: discord.Member):
@@ -276,16 +427,30 @@ class UserHistoryCog(commands.Cog, name="UserHistory"):
         server_id = str(interaction.guild.id)
         user_id = str(member.id)
 
-        user_data = self.bot.warning_data.get("warnings", {}).get(server_id, {}).get(user_id)
+        guild_map = self.bot.warning_data["warnings"].get(server_id)
+        user_data = guild_map.get(user_id) if guild_map else None
 
         if not user_data or not user_data.get("entries"):
             await interaction.followup.send(f"{member.mention} 没有管理记录。", ephemeral=True)
             return
 
+        # Entries are appended in chronological order, so no per-call sort is
+        # needed; one pass collects the active rows plus the type flags that
+        # drive the title, instead of three separate scans.
+        active_entries = []
+        has_warnings = False
+        has_notes = False
+        for entry in user_data["entries"]:
+            if entry.get("status", "active") == "cleared":
+                continue # Skip cleared entries, per user's desire for non-destructive delete
+            entry_type = entry.get("entry_type")
+            if entry_type == "warning":
+                has_warnings = True
+            elif entry_type == "note":
+                has_notes = True
+            active_entries.append(entry)
+
         # 根据记录类型选择标题
-        has_warnings = any(e.get("entry_type") == "warning" and e.get("status", "active") == "active" for e in user_data.get("entries", []))
-        has_notes = any(e.get("entry_type") == "note" and e.get("status", "active") == "active" for e in user_data.get("entries", []))
-        
         title = f"{member.display_name} 的管理记录"
         if has_notes and not has_warnings:
             title = f"{member.display_name} 的管理备注"
@@ -297,41 +462,35 @@ class UserHistoryCog(commands.Cog, name="UserHistory"):
         )
         history_embed.set_thumbnail(url=member.display_avatar.url)
         
-        active_entries_count = 0
-        for entry in sorted(user_data["entries"], key=lambda x: x["timestamp"]):
-            if entry.get("status", "active") == "cleared":
-                continue # Skip cleared entries for now, per user's desire for non-destructive delete
-            active_entries_count += 1
+        active_entries_count = len(active_entries)
+        # Embeds cap at 25 fields; only format the rows that will be shown.
+        for entry in active_entries[:25]:
+            entry_type = entry.get("entry_type")
+            entry_type_str, content_label, fixed_content = _TYPE_LABELS.get(entry_type, ("未知类型", "内容", None))
+            if fixed_content is not None:
+                content_value = fixed_content
+            elif entry_type == "warning":
+                content_value = entry.get("reason_displayed", entry.get("reason", "N/A")) # reason_displayed from new warn, reason from old
+            else:
+                content_value = entry.get("text", "N/A") # For notes
 
-            entry_type_str = "未知类型"
-            content_label = "内容"
-            content_value = entry.get("text", "N/A") # For notes
 
-            if entry.get("entry_type") == "warning":
-                entry_type_str = "警告"
-                content_label = "理由"
-                content_value = entry.get("reason_displayed", entry.get("reason", "N/A")) # reason_displayed from new warn, reason from old
-            elif entry.get("entry_type") == "note":
-                entry_type_str = "备注"
-            elif entry.get("entry_type") == "join_event":
-                entry_type_str = "加入服务器"
-                content_value = f"用户加入了服务器。"
-            elif entry.get("entry_type") == "leave_event":
-                entry_type_str = "离开服务器"
-                content_value = f"用户离开了服务器。"
-            
+            # 操作者名称在渲染时按ID从成员缓存解析，避免显示入库时的旧昵称；
+            # 成员已离开或是系统操作时退回存储的快照
+            operator_id = entry.get("operator_id")
+            operator_member = interaction.guild.get_member(int(operator_id)) if operator_id and str(operator_id).isdigit() else None
+            operator_name = operator_member.display_name if operator_member else entry.get("operator_name", "系统")
+
             # 按照知识模块要求格式化输出
             field_name = f"**{entry_type_str}** - <t:{entry['timestamp']}:f> (Case ID: {entry['case_id']})"
-            field_value = f"操作者: {entry.get('operator_name', '系统')} ({entry.get('operator_id', 'N/A')})\n{content_label}: {content_value}"
-            if entry.get("entry_type") == "warning" and entry.get("rule_id_matched"):
+            field_value = f"操作者: {operator_name} ({operator_id or 'N/A'})\n{content_label}: {content_value}"
+            if entry_type == "warning" and entry.get("rule_id_matched"):
                 field_value += f"\n涉及规则: {entry['rule_id_matched']}"
             
-            if len(history_embed.fields) < 25: # Embed field limit
-                 history_embed.add_field(name=field_name, value=field_value, inline=False)
-            else:
-                if not history_embed.footer.text or "更多记录未显示" not in history_embed.footer.text:
-                    history_embed.set_footer(text=f"共 {active_entries_count} 条记录 | 更多记录未显示 (已达上限)")
-                break 
+            history_embed.add_field(name=field_name, value=field_value, inline=False)
+
+        if active_entries_count > 25:
+            history_embed.set_footer(text=f"共 {active_entries_count} 条记录 | 更多记录未显示 (已达上限)")
 
         # 添加总计信息
         total_warnings = user_data.get("total_warnings", 0)